@@ -35,6 +35,14 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def artificial_wait(seconds: float, stage: str):
+    """화면 효과용 인위적 대기. 지연 로그에서 실제 작업과 구분되도록 artificial로 표시합니다. (site/final/tracing과 같은 형식)"""
+    time.sleep(seconds)
+    logger.info(json.dumps({"event": "span", "stage": stage, "ms": round(seconds * 1000, 1), "ok": True,
+                            "artificial": True}))
+
+
 # Streamlit secrets를 os.environ으로 복사
 try:
     if "OPENAI_API_KEY" not in os.environ and st.secrets.get("OPENAI_API_KEY"):
@@ -538,24 +546,30 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def display_page():
-    page_id = st.session_state.get('current_page', 1)
+@st.cache_resource(show_spinner=False)
+def load_page_registry() -> Dict[int, object]:
+    """metadata.json을 프로세스당 한 번만 읽고 페이지 id → 함수를 미리 찾아 둡니다."""
     if not os.path.exists("pages"):
-        st.warning("`pages` 디렉토리를 찾을 수 없습니다. 페이지를 동적으로 로드할 수 없습니다.")
-        return
-
+        raise FileNotFoundError("`pages` 디렉토리를 찾을 수 없습니다. 페이지를 동적으로 로드할 수 없습니다.")
     meta_path = os.path.join("pages", "metadata.json")
     if not os.path.exists(meta_path):
-        st.error("pages/metadata.json 파일을 찾을 수 없습니다.")
-        return
+        raise FileNotFoundError("pages/metadata.json 파일을 찾을 수 없습니다.")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    return {
+        p["id"]: getattr(importlib.import_module(f"pages.{p['module']}"), p["function"])
+        for p in metadata.get("pages", [])
+    }
+
+
+def display_page():
+    page_id = st.session_state.get('current_page', 1)
     try:
-        with open(meta_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-        page_info = next((p for p in metadata.get("pages", []) if p.get("id") == page_id), None)
-        if page_info:
-            module = importlib.import_module(f"pages.{page_info['module']}")
-            func = getattr(module, page_info['function'])
+        func = load_page_registry().get(page_id)
+        if func:
             func()
+    except FileNotFoundError as e:
+        st.warning(str(e))
     except Exception as e:
         logger.exception("페이지 로딩 실패")
         st.error(f"🚨 페이지 로딩 중 오류 발생: {e}")
@@ -702,7 +716,7 @@ elif page == 4:
             st.session_state['analysis_result'] = gpt_text
 
         st.success("분석 및 리포트 생성이 완료되었습니다!")
-        time.sleep(1)
+        artificial_wait(1, "page4.success_pause")
         go_to_page(5)
 
     except Exception as e:
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+관리자용 단계별 지연 통계 페이지 (tracing.stage_summary 조회)
+
+final_app에서 ADMIN_PAGES=1 환경변수를 켜고 ?admin=latency 로 접속하면 표시됩니다.
+"""
+import streamlit as st
+
+from tracing import stage_summary, reset
+
+
+def show_latency_admin():
+    st.subheader("⏱️ 단계별 지연 통계 (이 프로세스)")
+    summary = stage_summary()
+    if not summary:
+        st.info("아직 기록된 측정값이 없습니다.")
+        return
+
+    rows = [{"단계": stage, "건수": s["count"], "p50 (ms)": s["p50"], "p95 (ms)": s["p95"],
+             "p99 (ms)": s["p99"], "최대 (ms)": s["max"], "인위적 대기": "⚠️" if s["artificial"] else ""}
+            for stage, s in summary.items()]
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    artificial = [stage for stage, s in summary.items() if s["artificial"]]
+    if artificial:
+        st.warning(f"화면 효과용 인위적 대기(time.sleep)가 포함된 단계: {', '.join(artificial)}")
+
+    if st.button("통계 초기화"):
+        reset()
+        st.rerun()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+GPT 조언 응답 캐시
+
+- 분석 리포트를 정규화(problem_id 기준 정렬, 수치 details 구간화)한 값을 키로 사용합니다.
+  델타가 1~2cm 정도만 다른 리포트는 같은 키가 되어 GPT 호출 없이 바로 응답합니다.
+- SQLite 파일에 저장되므로 프로세스가 재시작되어도 유지됩니다.
+- TTL 만료와 최대 항목 수(가장 오래 사용되지 않은 항목부터 삭제) 기반으로 정리합니다.
+- 공유 캐시(shared_cache)가 켜져 있으면 같은 키로 그쪽에 저장해 모든 워커 프로세스가 조언을 함께 씁니다.
+  (이때 정리는 공유 캐시의 크기 기준 정리를 따르고, ADVICE_CACHE_PATH / MAX_ENTRIES는 쓰이지 않습니다)
+
+환경변수로 설정할 수 있습니다.
+    ADVICE_CACHE_PATH          (기본: .cache/advice_cache.sqlite3)
+    ADVICE_CACHE_TTL_SEC       (기본: 7일)
+    ADVICE_CACHE_MAX_ENTRIES   (기본: 2000)
+    ADVICE_CACHE_RESOLUTION_CM (기본: 2.0)
+"""
+import os
+import time
+import json
+import hashlib
+import logging
+import sqlite3
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import record_cache_lookup
+from shared_cache import get_shared_cache, make_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "advice_cache.sqlite3")
+DEFAULT_TTL_SEC = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_RESOLUTION_CM = 2.0
+DEFAULT_RESOLUTION_PCT = 2.0
+
+
+# --------------------------------------------------------------------------
+# 1. 리포트 정규화 및 캐시 키
+# --------------------------------------------------------------------------
+def _bucket(value: float, resolution: float) -> float:
+    """수치를 resolution 간격의 구간 대표값으로 반올림합니다."""
+    if not resolution:
+        return value
+    return round(round(value / resolution) * resolution, 3)
+
+
+def _canonical_value(value, resolution_cm: float, resolution_pct: float):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return _bucket(float(value), resolution_cm)
+    if isinstance(value, str) and value.endswith("%"):
+        # 예: "45.3%" (VIEWING_DISTANCE의 screen_width_ratio)
+        try:
+            return f"{_bucket(float(value[:-1]), resolution_pct)}%"
+        except ValueError:
+            return value
+    return value
+
+
+def canonicalize_report(report: list, resolution_cm: float = DEFAULT_RESOLUTION_CM,
+                        resolution_pct: float = DEFAULT_RESOLUTION_PCT) -> list:
+    """problem_id 순으로 정렬하고, details의 수치를 구간화한 리포트 사본을 반환합니다."""
+    canonical = []
+    for item in report:
+        details = item.get("details", {}) or {}
+        canonical.append({
+            "problem_id": item.get("problem_id"),
+            "severity": item.get("severity"),
+            "details": {k: _canonical_value(v, resolution_cm, resolution_pct) for k, v in sorted(details.items())},
+        })
+    return sorted(canonical, key=lambda p: (str(p["problem_id"]), str(p["severity"])))
+
+
+def make_report_key(report: list, namespace: str = "", resolution_cm: float = DEFAULT_RESOLUTION_CM) -> str:
+    """정규화된 리포트(와 모델명 등 namespace)로부터 캐시 키(sha256)를 만듭니다."""
+    payload = json.dumps({"ns": namespace, "report": canonicalize_report(report, resolution_cm)},
+                         ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------------------------------
+# 2. SQLite 기반 영속 캐시
+# --------------------------------------------------------------------------
+class AdviceCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_sec: float = DEFAULT_TTL_SEC,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, resolution_cm: float = DEFAULT_RESOLUTION_CM):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.resolution_cm = resolution_cm
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS advice_cache ("
+                " key TEXT PRIMARY KEY, advice TEXT NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_advice_last_access ON advice_cache(last_access)")
+
+    @contextmanager
+    def _connect(self):
+        """트랜잭션 단위 연결. 정상 종료 시 커밋하고 항상 닫습니다."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def key_for(self, report: list, namespace: str = "") -> str:
+        return make_report_key(report, namespace, self.resolution_cm)
+
+    def get(self, key: str) -> Optional[str]:
+        """캐시 적중 시 조언 텍스트를, 없거나 만료되었으면 None을 반환합니다."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT advice, created_at FROM advice_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl_sec:
+                    conn.execute("DELETE FROM advice_cache WHERE key = ?", (key,))
+                    row = None
+                record_cache_lookup("advice", row is not None)
+                if row is None:
+                    return None
+                conn.execute("UPDATE advice_cache SET last_access = ? WHERE key = ?", (now, key))
+                return row[0]
+        except sqlite3.Error:
+            logger.exception("조언 캐시 조회 실패")
+            return None
+
+    def put(self, key: str, advice: str) -> None:
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO advice_cache (key, advice, created_at, last_access) "
+                             "VALUES (?, ?, ?, ?)", (key, advice, now, now))
+                self._evict(conn, now)
+        except sqlite3.Error:
+            logger.exception("조언 캐시 저장 실패")
+
+    def _evict(self, conn, now: float) -> None:
+        """만료 항목을 지우고, 최대 항목 수를 넘으면 가장 오래 사용되지 않은 항목부터 지웁니다."""
+        conn.execute("DELETE FROM advice_cache WHERE created_at < ?", (now - self.ttl_sec,))
+        count = conn.execute("SELECT COUNT(*) FROM advice_cache").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute("DELETE FROM advice_cache WHERE key IN ("
+                         " SELECT key FROM advice_cache ORDER BY last_access ASC LIMIT ?)",
+                         (count - self.max_entries,))
+
+
+class SharedAdviceCache:
+    """공유 캐시 위의 조언 캐시. AdviceCache와 같은 key_for / get / put 인터페이스입니다."""
+
+    def __init__(self, cache, ttl_sec: float = DEFAULT_TTL_SEC, resolution_cm: float = DEFAULT_RESOLUTION_CM):
+        self.cache = cache
+        self.ttl_sec = ttl_sec
+        self.resolution_cm = resolution_cm
+
+    def key_for(self, report: list, namespace: str = "") -> str:
+        return make_report_key(report, namespace, self.resolution_cm)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(make_key("advice", key))
+
+    def put(self, key: str, advice: str) -> None:
+        self.cache.put(make_key("advice", key), advice, self.ttl_sec)
+
+
+def make_advice_cache():
+    """환경변수 설정으로 캐시를 생성합니다. 공유 캐시가 있으면 그것을 쓰고, 생성에 실패하면 None (캐시 없이 동작)."""
+    ttl_sec = float(os.environ.get("ADVICE_CACHE_TTL_SEC", DEFAULT_TTL_SEC))
+    resolution_cm = float(os.environ.get("ADVICE_CACHE_RESOLUTION_CM", DEFAULT_RESOLUTION_CM))
+    shared = get_shared_cache()
+    if shared is not None:
+        return SharedAdviceCache(shared, ttl_sec, resolution_cm)
+    try:
+        return AdviceCache(
+            path=os.environ.get("ADVICE_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_sec=ttl_sec,
+            max_entries=int(os.environ.get("ADVICE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            resolution_cm=resolution_cm,
+        )
+    except Exception:
+        logger.exception("조언 캐시 생성 실패")
+        return None
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+AI 조언 생성 (final_app에서 분리)
+
+Streamlit UI와 헤드리스 API(api_server)가 같은 캐시, 단일 비행(single-flight) 서비스, 속도 제한기,
+조언 모드(ADVICE_MODE: gpt / template / hybrid / fragment)를 공유하도록 조언 생성 흐름을 한 모듈에 둡니다.
+"""
+import time
+import logging
+from typing import Optional, Iterator, Callable
+
+from advice_cache import make_advice_cache, make_report_key
+from advice_service import get_advice_service
+from rate_limiter import get_limiter, current_session_id, QueueFullError
+from tracing import span, record_span
+from prompt_builder import build_advice_prompt, log_token_usage
+from advice_templates import (
+    SEVERITY_ORDER, get_advice_mode, generate_template_advice, build_template_sections, render_template_advice,
+    render_template_body, render_problem_block, build_summary_messages,
+)
+from advice_fragments import (
+    FRAGMENT_MAX_TOKENS, needs_fragment, fragment_key, build_fragment_messages,
+    fragment_summary_enabled, record_fragment_lookups,
+)
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------------------------------
+# 1. OpenAI 연동 설정
+# --------------------------------------------------------------------------
+# GPT 호출은 advice_service의 프로세스 공용 비동기 서비스가 담당합니다.
+# (동일한 리포트의 동시 요청은 업스트림 호출 하나로 합쳐집니다.)
+GPT_MODEL = "gpt-3.5-turbo"
+
+# 정규화된 리포트 기준 GPT 조언 캐시 (SQLite, 프로세스 재시작 후에도 유지)
+advice_cache = make_advice_cache()
+
+
+# --------------------------------------------------------------------------
+# 2. GPT 연동 및 프롬프트
+# --------------------------------------------------------------------------
+def _prepare_advice_request(report: list) -> dict:
+    """조언 모드에 맞는 요청 키, 메시지, 토큰 한도를 준비합니다. (hybrid는 짧은 종합 진단만 요청)"""
+    mode = get_advice_mode()
+    with span("advice.prompt_build", mode=mode):
+        if mode == "hybrid":
+            namespace, messages, max_tokens = f"{GPT_MODEL}:summary", build_summary_messages(report), 200
+        else:
+            namespace, messages, max_tokens = GPT_MODEL, build_advice_prompt(report), 1024
+    # 같은 키는 캐시 항목이자 동시 요청을 하나로 합치는 단위입니다.
+    key = advice_cache.key_for(report, namespace) if advice_cache else make_report_key(report, namespace)
+    return {"mode": mode, "key": key, "messages": messages, "max_tokens": max_tokens}
+
+
+def _finish_advice(report: list, mode: str, text: str) -> str:
+    """hybrid 모드에서는 GPT 요약을 템플릿 본문 앞에 붙여 전체 조언을 완성합니다."""
+    if mode == "hybrid":
+        return render_template_advice(build_template_sections(report), summary=text)
+    return text
+
+
+def get_gpt_recommendation(report: list, session_id: Optional[str] = None) -> str:
+    """분석 리포트를 바탕으로 GPT에게 상세 조언을 요청합니다."""
+    return "".join(stream_gpt_recommendation(report, session_id=session_id)).strip()
+
+
+def stream_gpt_recommendation(report: list, on_wait: Optional[Callable[[int], None]] = None,
+                              session_id: Optional[str] = None) -> Iterator[str]:
+    """
+    get_gpt_recommendation의 스트리밍 버전. 토큰이 도착하는 대로 텍스트 조각을 yield 합니다.
+    st.write_stream()에 그대로 넘길 수 있으며, 끝까지 받은 응답만 캐시에 저장합니다.
+    GPT 호출은 전역 속도 제한기의 차례를 기다리며, 대기 중에는 on_wait(대기 순번)이 호출됩니다.
+    session_id는 공정 대기열의 호출자 구분용이며, 없으면 현재 Streamlit 세션을 사용합니다.
+    """
+    session_id = session_id or current_session_id()
+    mode = get_advice_mode()
+    if mode == "template":
+        yield generate_template_advice(report)
+        return
+    if mode == "fragment":
+        yield from stream_fragment_advice(report, on_wait, session_id)
+        return
+
+    request = _prepare_advice_request(report)
+    mode, key = request["mode"], request["key"]
+    if advice_cache:
+        cached = advice_cache.get(key)
+        if cached is not None:
+            logger.info("GPT 조언 캐시 적중")
+            yield _finish_advice(report, mode, cached)
+            return
+
+    service = get_advice_service()
+    if not service:
+        logger.info("OpenAI 클라이언트가 없어 템플릿 조언으로 대체합니다.")
+        yield generate_template_advice(report)
+        return
+
+    # 진행 중인 동일 요청에 합류하는 경우는 업스트림 호출이 늘지 않으므로 대기열을 거치지 않습니다.
+    if not service.is_in_flight(key):
+        try:
+            with span("advice.queue_wait"):
+                get_limiter("GPT").acquire(session_id, on_wait=on_wait)
+        except (QueueFullError, TimeoutError):
+            logger.warning("GPT 대기열 포화로 템플릿 조언으로 대체합니다.")
+            yield "> ⚠️ 현재 AI 조언 요청이 많아 기본 조언을 먼저 보여드립니다. 잠시 후 다시 시도하면 AI 조언을 받을 수 있습니다.\n\n"
+            yield generate_template_advice(report)
+            return
+
+    if mode == "hybrid":
+        yield "1. **종합 진단**\n\n"
+    chunks = []
+    started = time.perf_counter()
+    flight = service.start(key, GPT_MODEL, request["messages"], timeout=45,
+                           temperature=0.7, max_tokens=request["max_tokens"])
+    try:
+        for piece in flight.stream(timeout=45):
+            if not chunks:
+                record_span("advice.gpt.first_token", (time.perf_counter() - started) * 1000, mode=mode)
+            chunks.append(piece)
+            yield piece
+    except Exception as e:
+        record_span("advice.gpt", (time.perf_counter() - started) * 1000, ok=False, mode=mode)
+        logger.exception("GPT 호출 실패")
+        yield f"\n\nGPT API 호출 중 오류가 발생했습니다: {type(e).__name__}: {e}"
+        if mode == "hybrid":
+            # GPT는 종합 진단만 맡으므로 나머지는 로컬 템플릿으로 그대로 보여줍니다.
+            sections = build_template_sections(report)
+            if not chunks:
+                yield "\n\n" + sections["summary"]
+            yield "\n\n" + render_template_body(sections)
+        return
+    record_span("advice.gpt", (time.perf_counter() - started) * 1000, mode=mode)
+
+    log_token_usage(f"advice:{mode}", request["messages"], flight.usage)
+    text = "".join(chunks).strip()
+    if advice_cache and text:
+        advice_cache.put(key, text)
+    if mode == "hybrid":
+        # 요약 이후의 섹션은 로컬 템플릿으로 즉시 채웁니다. (_finish_advice와 같은 결과)
+        yield "\n\n" + render_template_body(build_template_sections(report))
+
+
+def _start_flight(service, key: str, messages: list, max_tokens: int,
+                  on_wait: Optional[Callable[[int], None]] = None, session_id: str = "default"):
+    """속도 제한기 차례를 받은 뒤 GPT 호출을 시작합니다. 대기열이 가득 차면 None."""
+    if not service.is_in_flight(key):
+        try:
+            with span("advice.queue_wait"):
+                get_limiter("GPT").acquire(session_id, on_wait=on_wait)
+        except (QueueFullError, TimeoutError):
+            logger.warning("GPT 대기열 포화로 조언 조각 하나를 템플릿으로 대체합니다.")
+            return None
+    return service.start(key, GPT_MODEL, messages, timeout=45, temperature=0.7, max_tokens=max_tokens)
+
+
+def _stream_flight(flight, key: str, messages: list, label: str) -> Iterator[str]:
+    """진행 중인 호출의 텍스트를 흘려보내고, 끝까지 받으면 캐시에 저장합니다. 실패 시 예외를 그대로 올립니다."""
+    chunks = []
+    with span("advice.gpt", mode=label):
+        for piece in flight.stream(timeout=45):
+            chunks.append(piece)
+            yield piece
+    log_token_usage(label, messages, flight.usage)
+    text = "".join(chunks).strip()
+    if advice_cache and text:
+        advice_cache.put(key, text)
+
+
+def stream_fragment_advice(report: list, on_wait: Optional[Callable[[int], None]] = None,
+                           session_id: Optional[str] = None) -> Iterator[str]:
+    """
+    fragment 모드: 문제 항목별로 캐시된 조언 조각을 조립해 전체 조언을 만듭니다.
+    캐시에 없는 조각만 GPT에 요청하며, 모두 먼저 시작해 두고 순서대로 읽으므로 호출은 병렬로 진행됩니다.
+    종합 진단은 ADVICE_FRAGMENT_SUMMARY가 켜져 있으면 GPT가 짧게 작성하고, 아니면 템플릿을 씁니다.
+    """
+    session_id = session_id or current_session_id()
+    sections = build_template_sections(report)
+    problems = sorted((p for p in report if needs_fragment(p)),
+                      key=lambda p: SEVERITY_ORDER.get(p.get("severity"), 3))
+    keys = [fragment_key(p, f"{GPT_MODEL}:fragment") for p in problems]
+    cached = {}
+    if advice_cache:
+        for key in keys:
+            text = advice_cache.get(key)
+            if text is not None:
+                cached[key] = text
+    record_fragment_lookups(len(cached), len(keys))
+
+    summary_key, summary_messages, summary = None, None, None
+    if fragment_summary_enabled():
+        summary_messages = build_summary_messages(report)
+        summary_namespace = f"{GPT_MODEL}:summary"
+        summary_key = (advice_cache.key_for(report, summary_namespace) if advice_cache
+                       else make_report_key(report, summary_namespace))
+        summary = advice_cache.get(summary_key) if advice_cache else None
+
+    service = get_advice_service()
+    flights = {}
+    if service:
+        if summary_key and summary is None:
+            flights[summary_key] = _start_flight(service, summary_key, summary_messages, 200, on_wait, session_id)
+        for key, problem in zip(keys, problems):
+            if key not in cached:
+                flights[key] = _start_flight(service, key, build_fragment_messages(problem), FRAGMENT_MAX_TOKENS,
+                                             on_wait, session_id)
+
+    yield "1. **종합 진단**\n\n"
+    if summary is not None:
+        yield summary
+    elif flights.get(summary_key):
+        try:
+            yield from _stream_flight(flights[summary_key], summary_key, summary_messages, "advice:fragment-summary")
+        except Exception:
+            logger.exception("GPT 종합 진단 호출 실패")
+            yield sections["summary"]
+    else:
+        yield sections["summary"]
+
+    yield "\n\n2. **상세 개선 방안**\n\n"
+    if not problems:
+        yield sections["details"]
+    for i, (key, problem) in enumerate(zip(keys, problems)):
+        if i:
+            yield "\n\n"
+        if key in cached:
+            yield render_problem_block(problem, cached[key])
+            continue
+        if not flights.get(key):
+            yield render_problem_block(problem)
+            continue
+        yield render_problem_block(problem, "") + "\n"
+        try:
+            yield from _stream_flight(flights[key], key, build_fragment_messages(problem), "advice:fragment")
+        except Exception:
+            logger.exception("GPT 조언 조각 호출 실패: %s", problem.get("problem_id"))
+            yield "\n".join(render_problem_block(problem).split("\n")[2:])
+
+    yield f"\n\n3. **추가적인 팁**\n\n{sections['tips']}"
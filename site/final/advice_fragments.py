@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+문제 항목별 조언 조각(fragment) 캐시
+
+리포트 전체는 사용자마다 달라도 "모니터 높이 / High / +10~15cm"나 "손목 받침대 없음 / High" 같은
+개별 항목은 계속 반복됩니다. 그래서 '상세 개선 방안'의 해결책을 (problem_id, severity, 세부 구간) 단위의
+조각으로 GPT에게 받아 캐시하고, 전체 조언은 캐시된 조각을 조립해 만듭니다.
+
+- 조각 키는 해결책에 영향을 주는 세부 값만 굵은 구간(기본 5cm / 5%)으로 묶어 만듭니다.
+  사용자 키에 따라 달라지는 절대 높이 같은 값은 키와 프롬프트 모두에서 뺍니다.
+- GPT에는 구간화된 값만 보내므로, 캐시된 조각은 같은 구간의 모든 리포트에 그대로 맞습니다.
+  정확한 수치가 들어가는 '현재 상태' 줄은 조립할 때 로컬에서 채웁니다.
+- 캐시 저장소는 advice_cache.AdviceCache를 그대로 쓰고 네임스페이스로만 구분합니다.
+
+환경변수로 설정할 수 있습니다.
+    ADVICE_FRAGMENT_RESOLUTION_CM (기본: 5.0, 비율(%) 값에도 같은 간격을 사용)
+    ADVICE_FRAGMENT_SUMMARY       (기본: 1, 0이면 종합 진단을 GPT 대신 템플릿으로 작성)
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+
+from advice_cache import canonicalize_report
+from advice_templates import PROBLEM_ID_MAP, SEVERITY_MAP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRAGMENT_RESOLUTION_CM = 5.0
+FRAGMENT_MAX_TOKENS = 300
+
+# 해결책을 바꾸는 세부 값만 조각 키에 넣습니다.
+FRAGMENT_DETAIL_KEYS = {
+    "SCREEN_HEIGHT": ("delta_cm", "has_support"),
+    "LAPTOP_HEIGHT": ("delta_cm", "has_support", "has_external_keyboard"),
+    "WRIST_REST_PRESENCE": ("has_wrist_rest",),
+    "LIGHT_POSITION": ("handedness", "lamp_side"),
+    "KEYBOARD_MOUSE_DISTANCE": ("actual_distance_cm",),
+    "KEYBOARD_MOUSE_ALIGNMENT": ("is_vertically_aligned",),
+    "WINDOW_POSITION": ("horizontal_distance_cm",),
+    "VIEWING_DISTANCE": ("main_screen_type", "screen_width_ratio"),
+}
+
+FRAGMENT_INSTRUCTIONS = (
+    "당신은 인체공학 전문가입니다. 위 책상 환경 문제 항목 하나에 대한 구체적이고 실용적인 해결책을 "
+    "한국어 마크다운 글머리표('- ') 2~3줄로만 작성하세요. 제목, 현재 상태 설명, 일반적인 건강 팁은 쓰지 마세요."
+)
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def get_fragment_resolution_cm() -> float:
+    try:
+        return float(os.environ.get("ADVICE_FRAGMENT_RESOLUTION_CM", DEFAULT_FRAGMENT_RESOLUTION_CM))
+    except ValueError:
+        return DEFAULT_FRAGMENT_RESOLUTION_CM
+
+
+def fragment_summary_enabled() -> bool:
+    return os.environ.get("ADVICE_FRAGMENT_SUMMARY", "1").strip().lower() not in ("0", "false", "no")
+
+
+def needs_fragment(item: dict) -> bool:
+    """'상세 개선 방안'에 들어가는 항목(High/Moderate)만 조각을 만듭니다."""
+    return item.get("severity") != "Low"
+
+
+def canonical_fragment(item: dict, resolution: float = None) -> dict:
+    """조각 키와 프롬프트에 쓰는 구간화된 항목 사본."""
+    resolution = get_fragment_resolution_cm() if resolution is None else resolution
+    problem_id = item.get("problem_id")
+    keep = FRAGMENT_DETAIL_KEYS.get(problem_id)
+    details = item.get("details", {}) or {}
+    if keep is not None:
+        details = {k: v for k, v in details.items() if k in keep}
+    trimmed = {"problem_id": problem_id, "severity": item.get("severity"), "details": details}
+    return canonicalize_report([trimmed], resolution_cm=resolution, resolution_pct=resolution)[0]
+
+
+def fragment_key(item: dict, namespace: str = "", resolution: float = None) -> str:
+    payload = json.dumps({"ns": namespace, "fragment": canonical_fragment(item, resolution)},
+                         ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_fragment_messages(item: dict, resolution: float = None) -> list:
+    """구간화된 항목 하나에 대한 해결책만 요청하는 메시지를 만듭니다."""
+    fragment = canonical_fragment(item, resolution)
+    problem_id = fragment["problem_id"]
+    details = ",".join(f"{k}={v}" for k, v in fragment["details"].items()) or "-"
+    prompt_text = (
+        f"문제 항목: {PROBLEM_ID_MAP.get(problem_id, problem_id)} ({problem_id})\n"
+        f"심각도: {SEVERITY_MAP.get(fragment['severity'], fragment['severity'])}\n"
+        f"세부(구간값): {details}\n\n{FRAGMENT_INSTRUCTIONS}"
+    )
+    return [
+        {"role": "system", "content": "You are a world-class ergonomics expert providing advice in Korean."},
+        {"role": "user", "content": prompt_text}
+    ]
+
+
+def record_fragment_lookups(hits: int, total: int) -> None:
+    """조립 한 번의 적중 수를 누적하고 누적 적중률을 로그로 남깁니다."""
+    with _stats_lock:
+        _stats["hits"] += hits
+        _stats["misses"] += total - hits
+        seen = _stats["hits"] + _stats["misses"]
+        rate = _stats["hits"] / seen * 100 if seen else 0.0
+    logger.info("조언 조각 캐시: 이번 %d/%d 적중 (누적 적중률 %.0f%%)", hits, total, rate)
+
+
+def fragment_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
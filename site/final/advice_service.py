@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+비동기 GPT 조언 서비스 (single-flight 요청 합치기)
+
+- 백그라운드 스레드 하나에서 asyncio 이벤트 루프와 AsyncOpenAI 클라이언트를 돌립니다.
+- 같은 키(정규화된 리포트 등)의 요청이 동시에 들어오면 업스트림 호출은 하나만 보내고,
+  나머지 요청은 그 호출의 스트림/결과를 함께 받습니다. (팀 단위 책상 점검처럼 동일한 리포트가 몰릴 때)
+- Streamlit 스크립트는 동기 코드이므로 AdviceFlight.stream() / result()로 결과를 받습니다.
+
+사용 예:
+    service = get_advice_service()
+    flight = service.start(cache_key, "gpt-3.5-turbo", messages, max_tokens=1024)
+    for piece in flight.stream(timeout=45): ...   # 또는 text = flight.result(timeout=45)
+"""
+import os
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_RETRIES = 3
+
+
+class AdviceFlight:
+    """진행 중인 업스트림 호출 하나. 여러 호출자가 같은 청크 목록을 처음부터 다시 읽습니다."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks = []
+        self.usage = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 1  # 이 호출을 함께 기다리는 요청 수
+        self._cond = threading.Condition()
+
+    def _push(self, piece: str) -> None:
+        with self._cond:
+            self.chunks.append(piece)
+            self._cond.notify_all()
+
+    def _finish(self, error: Optional[BaseException] = None, usage=None) -> None:
+        with self._cond:
+            self.error, self.usage, self.done = error, usage, True
+            self._cond.notify_all()
+
+    def stream(self, timeout: float = 45) -> Iterator[str]:
+        """도착한 텍스트 조각을 순서대로 yield 합니다. timeout초 동안 새 조각이 없으면 TimeoutError."""
+        i = 0
+        while True:
+            with self._cond:
+                if i >= len(self.chunks) and not self.done:
+                    if not self._cond.wait(timeout) and i >= len(self.chunks) and not self.done:
+                        raise TimeoutError(f"GPT 응답이 {timeout}초 동안 도착하지 않았습니다.")
+                new_chunks = self.chunks[i:]
+                finished = self.done and i + len(new_chunks) >= len(self.chunks)
+            for piece in new_chunks:
+                yield piece
+            i += len(new_chunks)
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def result(self, timeout: float = 45) -> str:
+        return "".join(self.stream(timeout)).strip()
+
+
+class AdviceService:
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        from openai import AsyncOpenAI
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="advice-service", daemon=True)
+        self._thread.start()
+        self._client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        self._flights: Dict[str, AdviceFlight] = {}
+        self._lock = threading.Lock()
+
+    def is_in_flight(self, key: str) -> bool:
+        """같은 키의 호출이 진행 중이면 True (합류하는 요청은 속도 제한 토큰을 쓰지 않아도 됩니다)."""
+        with self._lock:
+            return key in self._flights
+
+    def start(self, key: str, model: str, messages: list, timeout: float = 45, **params) -> AdviceFlight:
+        """key로 진행 중인 호출이 있으면 합류하고, 없으면 새 스트리밍 호출을 시작합니다."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.subscribers += 1
+                logger.info("동일한 조언 요청이 진행 중이어서 합류합니다: %s (대기 %d건)", key[:12], flight.subscribers)
+                return flight
+            flight = AdviceFlight(key)
+            self._flights[key] = flight
+        asyncio.run_coroutine_threadsafe(self._run(flight, model, messages, timeout, params), self._loop)
+        return flight
+
+    async def _create_stream(self, model: str, messages: list, timeout: float, params: dict):
+        """제공자 rate limit(429)에 걸리면 지수 백오프로 몇 번 더 시도합니다."""
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                return await self._client.chat.completions.create(
+                    model=model, messages=messages, timeout=timeout,
+                    stream=True, stream_options={"include_usage": True}, **params)
+            except Exception as e:
+                if type(e).__name__ != "RateLimitError" or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                delay = 2 ** attempt
+                logger.warning("GPT rate limit에 걸려 %d초 후 다시 시도합니다 (%d/%d)", delay, attempt + 1,
+                               RATE_LIMIT_RETRIES)
+                await asyncio.sleep(delay)
+
+    async def _run(self, flight: AdviceFlight, model: str, messages: list, timeout: float, params: dict) -> None:
+        usage = None
+        try:
+            stream = await self._create_stream(model, messages, timeout, params)
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    flight._push(chunk.choices[0].delta.content)
+        except Exception as e:
+            flight._finish(error=e)
+        else:
+            flight._finish(usage=usage)
+        finally:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+
+_service: Optional[AdviceService] = None
+_service_lock = threading.Lock()
+
+
+def get_advice_service(api_key: Optional[str] = None) -> Optional[AdviceService]:
+    """프로세스 공용 서비스를 반환합니다. API 키나 openai 라이브러리가 없으면 None."""
+    global _service
+    if _service is not None:
+        return _service
+    key = api_key or os.environ.get("OPENAI_API_KEY")
+    if not key:
+        logger.info("OpenAI API 키가 없습니다.")
+        return None
+    with _service_lock:
+        if _service is None:
+            # NOTE: openai는 선택적 의존성이고 import 비용이 커서 첫 조언 요청 때 서비스와 함께 불러옵니다.
+            try:
+                _service = AdviceService(key, base_url=os.environ.get("OPENAI_BASE_URL"))
+            except ImportError:
+                logger.info("openai 라이브러리를 찾을 수 없습니다.")
+                return None
+            except Exception:
+                logger.exception("조언 서비스 생성 실패")
+                return None
+    return _service
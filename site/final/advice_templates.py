@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+결과 포맷팅 유틸리티(한글 번역)와 오프라인 템플릿 조언 엔진
+
+- PROBLEM_ID_MAP / SEVERITY_MAP / format_details_korean: 5단계 상세 분석 데이터 표시용
+- generate_template_advice: GPT 프롬프트가 요구하는 구조(종합 진단 / 상세 개선 방안 / 추가적인 팁)를
+  외부 호출 없이 로컬에서 1ms 이내로 생성합니다.
+- ADVICE_MODE 환경변수로 조언 생성 방식을 선택합니다.
+    "gpt"      : 전체 조언을 GPT가 작성 (기본값)
+    "template" : 템플릿 엔진만 사용 (GPT 호출 없음)
+    "hybrid"   : GPT는 짧은 종합 진단만 작성하고, 나머지는 템플릿으로 채움
+    "fragment" : 문제 항목별 조언 조각을 GPT로 만들어 캐시하고 조합 (advice_fragments 참고)
+  OpenAI 클라이언트가 없으면 모드와 관계없이 템플릿 엔진을 사용합니다.
+"""
+import os
+import json
+from typing import Optional
+
+ADVICE_MODES = ("gpt", "template", "hybrid", "fragment")
+
+
+def get_advice_mode() -> str:
+    mode = os.environ.get("ADVICE_MODE", "gpt").strip().lower()
+    return mode if mode in ADVICE_MODES else "gpt"
+
+
+# --------------------------------------------------------------------------
+# 1. 결과 포맷팅 유틸리티 (한글 번역)
+# --------------------------------------------------------------------------
+
+
+# 각 problem_id와 severity를 한글로 변환하기 위한 딕셔너리
+PROBLEM_ID_MAP = {
+    "SCREEN_HEIGHT": "모니터 높이",
+    "LAPTOP_HEIGHT": "노트북 화면 높이",
+    "WRIST_REST_PRESENCE": "손목 받침대 유무",
+    "LIGHT_POSITION": "조명 위치",
+    "KEYBOARD_MOUSE_DISTANCE": "키보드-마우스 거리",
+    "KEYBOARD_MOUSE_ALIGNMENT": "키보드-마우스 정렬",
+    "WINDOW_POSITION": "창문과의 거리 및 방향",
+    "VIEWING_DISTANCE": "시야 거리"
+}
+
+SEVERITY_MAP = {
+    "High": "높음 🩸",
+    "Moderate": "중간 ⚠️",
+    "Low": "낮음 ✅"
+}
+
+
+def format_details_korean(problem_id: str, details: dict) -> str:
+    """각 문제 항목의 상세 내용을 한글로 풀어 설명합니다."""
+    if problem_id == "WRIST_REST_PRESENCE":
+        return "손목 받침대가 없습니다. 장시간 사용 시 손목 터널 증후군의 위험이 있습니다." if not details.get(
+            "has_wrist_rest") else "손목 받침대를 올바르게 사용하고 있습니다."
+
+    elif "HEIGHT" in problem_id:
+        delta = details.get('delta_cm', 0)
+        ideal = details.get('ideal_height_cm', 0)
+        actual = details.get('estimated_actual_height_cm', 0)
+        if delta > 0:
+            return f"화면이 이상적인 높이({ideal}cm)보다 약 {delta}cm 높습니다. 화면을 낮춰주세요."
+        else:
+            return f"화면이 이상적인 높이({ideal}cm)보다 약 {abs(delta)}cm 낮습니다. 받침대를 사용해 높여주세요."
+
+    elif problem_id == "VIEWING_DISTANCE":
+        ratio = details.get('screen_width_ratio', '0%')
+        return f"화면이 시야에서 차지하는 비율이 {ratio}입니다. 너무 가깝거나 멀 경우 눈에 피로를 줄 수 있습니다. 팔 길이 정도의 거리를 유지하는 것이 좋습니다."
+
+    elif problem_id == "LIGHT_POSITION":
+        hand = details.get("handedness", "")
+        side = details.get("lamp_side", "")
+        if "왼손" in hand and side == "left":
+            return "왼손잡이 사용자의 조명이 왼쪽에 있어 글씨를 쓸 때 그림자가 생길 수 있습니다. 조명을 오른쪽으로 옮겨주세요."
+        if "오른손" in hand and side == "right":
+            return "오른손잡이 사용자의 조명이 오른쪽에 있어 글씨를 쓸 때 그림자가 생길 수 있습니다. 조명을 왼쪽으로 옮겨주세요."
+        return "조명이 올바른 위치에 있습니다."
+
+    elif problem_id == "KEYBOARD_MOUSE_DISTANCE":
+        actual = details.get('actual_distance_cm', 0)
+        return f"키보드와 마우스 사이의 거리가 약 {actual}cm로, 어깨 너비보다 넓어 보입니다. 어깨에 부담을 줄 수 있으니 간격을 좁혀주세요."
+
+    elif problem_id == "KEYBOARD_MOUSE_ALIGNMENT":
+        if details.get("is_vertically_aligned"):
+            return "마우스가 키보드와 같은 줄에 잘 정렬되어 있습니다."
+        return "마우스가 키보드보다 앞이나 뒤로 벗어나 있어 팔을 뻗게 됩니다. 키보드와 같은 줄에 놓아주세요."
+
+    elif problem_id == "WINDOW_POSITION":
+        distance = details.get('horizontal_distance_cm', 0)
+        return f"창문이 화면과 가로로 약 {distance}cm 떨어져 있습니다. 창문이 화면 바로 앞이나 뒤에 있으면 눈부심과 반사가 생길 수 있습니다."
+
+    # 다른 모든 케이스에 대한 기본 설명
+    return json.dumps(details, ensure_ascii=False)
+
+
+# --------------------------------------------------------------------------
+# 2. 템플릿 조언 엔진
+# --------------------------------------------------------------------------
+SEVERITY_ORDER = {"High": 0, "Moderate": 1, "Low": 2}
+
+GENERAL_TIPS = [
+    "**20-20-20 규칙**: 20분마다 20피트(약 6m) 떨어진 곳을 20초간 바라보며 눈의 긴장을 풀어주세요.",
+    "**주기적인 스트레칭**: 1시간에 한 번은 자리에서 일어나 목, 어깨, 손목을 가볍게 돌리고 늘려주세요.",
+    "**의자와 발 받침**: 의자 높이를 무릎이 90도가 되도록 맞추고, 발이 바닥에 닿지 않으면 발 받침대를 사용하세요.",
+]
+
+
+def _solution_tips(problem_id: str, details: dict) -> list:
+    """문제 항목별 구체적인 해결 방법 목록을 반환합니다."""
+    if "HEIGHT" in problem_id:
+        tips = []
+        if details.get('delta_cm', 0) > 0:
+            tips.append("모니터 암이나 스탠드의 높이 조절 기능으로 화면 상단이 눈높이와 같거나 약간 아래에 오도록 낮추세요.")
+            if details.get("has_support"):
+                tips.append("현재 사용 중인 받침대를 낮은 것으로 바꾸거나 제거하는 것도 방법입니다.")
+        else:
+            tips.append("모니터 받침대나 모니터 암을 사용해 화면 상단이 눈높이에 오도록 높여주세요.")
+        if problem_id == "LAPTOP_HEIGHT" and not details.get("has_external_keyboard"):
+            tips.append("노트북 거치대로 화면을 올리고, 외장 키보드와 마우스를 함께 사용하면 목과 손목 부담을 모두 줄일 수 있습니다.")
+        return tips
+    if problem_id == "WRIST_REST_PRESENCE":
+        return ["키보드와 마우스 앞에 젤 또는 메모리폼 손목 받침대를 두세요.",
+                "타이핑 중에는 손목을 띄우고, 쉬는 동안 손바닥 아랫부분을 받침대에 올려두는 것이 올바른 사용법입니다."]
+    if problem_id == "LIGHT_POSITION":
+        return ["주로 쓰는 손의 반대편에서 빛이 오도록 조명을 옮기면 필기할 때 손 그림자가 생기지 않습니다."]
+    if problem_id == "KEYBOARD_MOUSE_DISTANCE":
+        return ["마우스를 키보드 바로 옆으로 붙여 팔꿈치가 몸 옆에 자연스럽게 놓이도록 하세요.",
+                "숫자 키패드가 없는 텐키리스 키보드를 사용하면 마우스를 더 가깝게 둘 수 있습니다."]
+    if problem_id == "KEYBOARD_MOUSE_ALIGNMENT":
+        return ["마우스를 키보드와 같은 앞뒤 위치에 두어 팔을 앞으로 뻗지 않도록 하세요."]
+    if problem_id == "WINDOW_POSITION":
+        return ["창문이 화면의 옆쪽(직각 방향)에 오도록 책상을 배치하세요.",
+                "블라인드나 커튼으로 화면 반사와 눈부심을 줄여주세요."]
+    if problem_id == "VIEWING_DISTANCE":
+        return ["화면과 눈 사이를 팔 길이(약 50~70cm) 정도로 유지하세요.",
+                "글자가 작아 가까이 다가가게 된다면 화면 배율을 키우는 것이 좋습니다."]
+    return []
+
+
+def render_problem_block(item: dict, solution_md: Optional[str] = None) -> str:
+    """'상세 개선 방안'의 항목 하나. solution_md가 없으면 템플릿 해결책을 사용합니다."""
+    problem_id, details = item["problem_id"], item.get("details", {})
+    title = PROBLEM_ID_MAP.get(problem_id, problem_id)
+    if solution_md is None:
+        solution_md = "\n".join(f"- {tip}" for tip in _solution_tips(problem_id, details))
+    lines = [f"**{title}** ({SEVERITY_MAP.get(item['severity'], item['severity'])})",
+             f"- 현재 상태: {format_details_korean(problem_id, details)}"]
+    if solution_md:
+        lines.append(solution_md)
+    return "\n".join(lines)
+
+
+def build_template_sections(report: list) -> dict:
+    """리포트로부터 '종합 진단', '상세 개선 방안', '추가적인 팁' 세 섹션의 마크다운을 만듭니다."""
+    items = sorted(report, key=lambda p: SEVERITY_ORDER.get(p.get("severity"), 3))
+    problems = [p for p in items if p.get("severity") != "Low"]
+    good = [PROBLEM_ID_MAP.get(p.get("problem_id"), p.get("problem_id")) for p in items if p.get("severity") == "Low"]
+
+    # 종합 진단
+    summary_lines = []
+    if good:
+        summary_lines.append(f"- 👍 잘 되어 있는 점: {', '.join(good)}")
+    if problems:
+        urgent = [p for p in problems if p.get("severity") == problems[0].get("severity")]
+        urgent_titles = ', '.join(PROBLEM_ID_MAP.get(p["problem_id"], p["problem_id"]) for p in urgent)
+        summary_lines.append(f"- 🚨 가장 시급한 개선 사항: {urgent_titles}")
+        summary_lines.append(f"- 개선이 필요한 항목은 총 {len(problems)}개입니다.")
+    else:
+        summary_lines.append("- 🎉 분석된 모든 항목이 양호합니다. 지금의 책상 환경을 잘 유지해주세요!")
+
+    # 상세 개선 방안
+    detail_blocks = [render_problem_block(p) for p in problems]
+    details_md = "\n\n".join(detail_blocks) if detail_blocks else "개선이 필요한 항목이 없습니다."
+
+    return {
+        "summary": "\n".join(summary_lines),
+        "details": details_md,
+        "tips": "\n".join(f"- {tip}" for tip in GENERAL_TIPS),
+    }
+
+
+def render_template_body(sections: dict) -> str:
+    """종합 진단 뒤에 오는 '상세 개선 방안', '추가적인 팁' 부분. (hybrid 모드가 GPT 요약 뒤에 바로 이어 붙임)"""
+    return (
+        f"2. **상세 개선 방안**\n\n{sections['details']}\n\n"
+        f"3. **추가적인 팁**\n\n{sections['tips']}"
+    )
+
+
+def render_template_advice(sections: dict, summary: Optional[str] = None) -> str:
+    """섹션을 GPT 응답과 같은 번호 목록 형식으로 조합합니다. summary가 주어지면 종합 진단을 대체합니다."""
+    return f"1. **종합 진단**\n\n{summary or sections['summary']}\n\n" + render_template_body(sections)
+
+
+def generate_template_advice(report: list) -> str:
+    """GPT 없이 리포트만으로 전체 조언을 생성합니다."""
+    return render_template_advice(build_template_sections(report))
+
+
+def build_summary_messages(report: list) -> list:
+    """하이브리드 모드에서 GPT에게 짧은 종합 진단만 요청하는 메시지를 만듭니다."""
+    lines = [f"- {PROBLEM_ID_MAP.get(p['problem_id'], p['problem_id'])}: {p['severity']}" for p in report]
+    prompt_text = (
+        "다음은 사용자의 책상 환경 인체공학 분석 결과 요약입니다:\n" + "\n".join(lines) + "\n\n"
+        "긍정적인 점과 가장 시급하게 개선해야 할 점을 2~3문장의 한국어로 친절하게 요약해주세요. "
+        "구체적인 해결책과 일반 팁은 쓰지 마세요."
+    )
+    return [
+        {"role": "system", "content": "You are a world-class ergonomics expert providing advice in Korean."},
+        {"role": "user", "content": prompt_text}
+    ]
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+사용자별 분석 기록 (SQLite)
+
+세션이 끝나면 감지 결과, 리포트, AI 조언, 피드백 이미지가 모두 사라져 다시 보려면 이미지를 올리고
+감지/GPT 비용을 다시 내야 했습니다. 완료된 분석을 여기에 저장해 두면 외부 호출 없이 바로 다시 열 수 있습니다.
+
+- 이미지 바이트는 blob_store에 두고 기록에는 핸들만 저장합니다. 저장할 때 핸들을 pin 해서
+  블롭 저장소의 TTL 정리 대상에서 빼고, 기록을 지우면 unpin 합니다.
+- WAL 모드라 여러 Streamlit 프로세스가 읽는 동안에도 쓰기가 막히지 않습니다.
+- 목록은 (user_id, id) 인덱스를 따라 id 커서로 페이지를 넘깁니다. (OFFSET 없이 기록이 길어도 일정한 비용)
+- 같은 사용자가 같은 이미지(image_hash)와 같은 입력으로 다시 분석하면 새 행 대신 기존 기록을 갱신합니다.
+
+환경변수로 설정할 수 있습니다.
+    ANALYSIS_HISTORY_PATH  (기본: .cache/analysis_history.sqlite3)
+"""
+import os
+import time
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from blob_store import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = os.path.join(".cache", "analysis_history.sqlite3")
+DEFAULT_PAGE_SIZE = 10
+
+
+class AnalysisHistory:
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL, image_hash TEXT NOT NULL, analysis_key TEXT NOT NULL,"
+                " created_at REAL NOT NULL, monitor_inch REAL, problem_count INTEGER NOT NULL,"
+                " preview_handle TEXT, feedback_handle TEXT, payload TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_user ON analyses(user_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_user_image ON analyses(user_id, image_hash)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_analyses_user_key ON analyses(user_id, analysis_key)")
+            # 기록이 참조하는 블롭 핸들 (삭제 시 다른 기록이 아직 쓰는지 확인)
+            conn.execute("CREATE TABLE IF NOT EXISTS analysis_blobs ("
+                         " analysis_id INTEGER NOT NULL, handle TEXT NOT NULL, PRIMARY KEY (analysis_id, handle))")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_blobs_handle ON analysis_blobs(handle)")
+
+    @contextmanager
+    def _connect(self):
+        """트랜잭션 단위 연결. 정상 종료 시 커밋하고 항상 닫습니다."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _handles(workflow_result: list, preview_handle: Optional[str], feedback_handle: Optional[str]) -> List[str]:
+        handles = [preview_handle, feedback_handle]
+        handles.extend(r.get("output_image_handle") for r in workflow_result or [])
+        return [h for h in handles if h]
+
+    def save(self, user_id: str, image_hash: str, analysis_key: str, workflow_result: list, main_screen: dict,
+             monitor_inch: float, user_inputs: dict, report: list, advice: Optional[str],
+             feedback_handle: Optional[str] = None, preview_handle: Optional[str] = None) -> int:
+        """완료된 분석 하나를 저장하고 기록 id를 반환합니다. 같은 (user_id, analysis_key)가 있으면 갱신합니다."""
+        # 이미 정리된 블롭(다른 프로세스가 만든 공유 캐시 핸들 등)은 기록에 남기지 않습니다.
+        store = get_blob_store()
+        missing = {handle for handle in self._handles(workflow_result, preview_handle, feedback_handle)
+                   if not store.pin(handle)}
+        if missing:
+            logger.warning("블롭 %d개가 이미 정리되어 이미지 없이 기록합니다.", len(missing))
+            preview_handle = None if preview_handle in missing else preview_handle
+            feedback_handle = None if feedback_handle in missing else feedback_handle
+            workflow_result = [
+                {k: v for k, v in r.items() if not (k == "output_image_handle" and v in missing)}
+                for r in workflow_result or []
+            ]
+        handles = set(self._handles(workflow_result, preview_handle, feedback_handle))
+        payload = json.dumps({
+            "workflow_result": workflow_result, "main_screen": main_screen, "user_inputs": user_inputs,
+            "report": report, "advice": advice,
+        }, ensure_ascii=False, default=str)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO analyses (user_id, image_hash, analysis_key, created_at, monitor_inch, problem_count,"
+                " preview_handle, feedback_handle, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(user_id, analysis_key) DO UPDATE SET created_at = excluded.created_at,"
+                " monitor_inch = excluded.monitor_inch, problem_count = excluded.problem_count,"
+                " preview_handle = excluded.preview_handle, feedback_handle = excluded.feedback_handle,"
+                " payload = excluded.payload",
+                (user_id, image_hash, analysis_key, time.time(), monitor_inch, len(report or []),
+                 preview_handle, feedback_handle, payload))
+            analysis_id = conn.execute("SELECT id FROM analyses WHERE user_id = ? AND analysis_key = ?",
+                                       (user_id, analysis_key)).fetchone()["id"]
+            previous = self._detach_blobs(conn, analysis_id)
+            conn.executemany("INSERT INTO analysis_blobs (analysis_id, handle) VALUES (?, ?)",
+                             [(analysis_id, handle) for handle in handles])
+            orphaned = self._orphaned(conn, previous - handles)
+        self._unpin(orphaned)
+        return analysis_id
+
+    @staticmethod
+    def _detach_blobs(conn, analysis_id: int) -> set:
+        handles = {row["handle"] for row in conn.execute(
+            "SELECT handle FROM analysis_blobs WHERE analysis_id = ?", (analysis_id,))}
+        conn.execute("DELETE FROM analysis_blobs WHERE analysis_id = ?", (analysis_id,))
+        return handles
+
+    @staticmethod
+    def _orphaned(conn, handles) -> List[str]:
+        """어떤 기록도 더 이상 참조하지 않는 핸들."""
+        return [handle for handle in handles if conn.execute(
+            "SELECT 1 FROM analysis_blobs WHERE handle = ? LIMIT 1", (handle,)).fetchone() is None]
+
+    @staticmethod
+    def _unpin(handles: List[str]) -> None:
+        store = get_blob_store()
+        for handle in handles:
+            store.unpin(handle)
+
+    def page(self, user_id: str, before_id: Optional[int] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[dict], Optional[int]]:
+        """
+        최신순 요약 목록 한 페이지와 다음 페이지 커서를 반환합니다. 마지막 페이지면 커서는 None.
+        (payload는 읽지 않으므로 목록 표시는 가볍습니다)
+        """
+        query = ("SELECT id, image_hash, created_at, monitor_inch, problem_count, preview_handle"
+                 " FROM analyses WHERE user_id = ?")
+        params: list = [user_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+        with self._connect() as conn:
+            rows = [dict(row) for row in conn.execute(query, params)]
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def load(self, user_id: str, analysis_id: int) -> Optional[dict]:
+        """기록 하나 전체. 다른 사용자의 기록이거나 없으면 None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM analyses WHERE id = ? AND user_id = ?",
+                               (analysis_id, user_id)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record.update(json.loads(record.pop("payload")))
+        return record
+
+    def find_by_image(self, user_id: str, image_hash: str) -> Optional[dict]:
+        """같은 이미지로 한 가장 최근 분석의 요약. 없으면 None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT id, created_at, monitor_inch, problem_count FROM analyses"
+                               " WHERE user_id = ? AND image_hash = ? ORDER BY id DESC LIMIT 1",
+                               (user_id, image_hash)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, user_id: str, analysis_id: int) -> bool:
+        """기록을 지우고, 다른 기록이 쓰지 않는 블롭의 pin을 풉니다."""
+        with self._connect() as conn:
+            if conn.execute("DELETE FROM analyses WHERE id = ? AND user_id = ?", (analysis_id, user_id)).rowcount == 0:
+                return False
+            orphaned = self._orphaned(conn, self._detach_blobs(conn, analysis_id))
+        self._unpin(orphaned)
+        return True
+
+
+_history: Optional[AnalysisHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_analysis_history() -> Optional[AnalysisHistory]:
+    """프로세스 공용 기록 저장소. 생성에 실패하면 None (기록 없이 동작)."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            try:
+                _history = AnalysisHistory(os.environ.get("ANALYSIS_HISTORY_PATH", DEFAULT_HISTORY_PATH))
+            except Exception:
+                logger.exception("분석 기록 저장소 생성 실패")
+                return None
+        return _history
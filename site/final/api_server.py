@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+헤드리스 HTTP API (인트라넷 포털, 스크립트 등 Streamlit 밖의 클라이언트용)
+
+Streamlit UI와 같은 분석 엔진(desk_analysis), 피드백 렌더링(pipeline/image_visualizer),
+AI 조언(advice_engine)을 JSON 엔드포인트로 제공합니다. 상태는 프로세스 공용 캐시/블롭 저장소에만 두므로
+UI와 별개로 여러 인스턴스를 띄워 수평 확장할 수 있습니다.
+
+    python api_server.py --port 8600
+
+    GET  /healthz
+    GET  /metrics     Prometheus 텍스트 형식 지표 (metrics 참고)
+    POST /v1/detect   {"image_b64", "filename"?, "skip_quality_check"?}         → {"workflow_result", "screens", "quality"}
+    POST /v1/analyze  {"workflow_result", "main_screen" | "main_screen_index",
+                       "monitor_inch", "user_inputs"}                           → {"report"}
+    POST /v1/render   (analyze와 같은 입력, "format"?: "png" | "json" | "svg")    → {"image_b64", "handle"}
+                                                                                  | {"overlay"} | {"svg"}
+    POST /v1/advise   {"report"}                                                → {"advice"}
+    POST /v1/run      {"image_b64", "main_screen_index"?, "monitor_inch",
+                       "user_inputs", "advice"?: true}                          → 위 결과 전체
+
+- 감지/GPT 호출은 UI와 같은 전역 공정 대기열을 거칩니다. 호출자 구분은 X-Client-Id 헤더(없으면 IP)입니다.
+- 감지 전에 로컬 품질 검사(image_quality)를 하고, 흐리거나 어둡거나 작은 사진은 감지 호출 없이 422를 반환합니다.
+  skip_quality_check: true면 검사 결과와 상관없이 감지합니다.
+- /v1/render의 format이 json/svg면 이미지를 그리지 않고 문제별로 켜고 끌 수 있는 오버레이 명세/SVG만 반환합니다.
+  (클라이언트가 원본 사진 위에 겹침, image_visualizer.build_feedback_overlay 참고)
+- 무거운 요청은 API_WORKERS개까지만 동시에 처리하고, API_QUEUE_TIMEOUT_SEC 안에 차례가 오지 않으면 503을 반환합니다.
+"""
+import os
+import json
+import base64
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rate_limiter import QueueFullError
+from detection import detect_workflow, find_screens
+from image_quality import check_image_quality, preflight_enabled, record_override, REJECT
+from advice_engine import get_gpt_recommendation
+from pipeline import build_overlay, run_analysis, submit_stage
+from blob_store import get_blob_store
+from tracing import span
+from metrics import CONTENT_TYPE, render_metrics
+
+logger = logging.getLogger(__name__)
+
+API_WORKERS = int(os.environ.get("API_WORKERS", 8))
+API_QUEUE_TIMEOUT_SEC = float(os.environ.get("API_QUEUE_TIMEOUT_SEC", 30))
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+_workers = threading.BoundedSemaphore(API_WORKERS)
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _require(payload: dict, *keys):
+    missing = [k for k in keys if payload.get(k) in (None, "")]
+    if missing:
+        raise ApiError(400, f"필수 항목이 없습니다: {', '.join(missing)}")
+
+
+def _check_workflow_result(workflow_result) -> dict:
+    """클라이언트가 보낸 workflow_result가 감지 응답 형식({"predictions": {"predictions": [...]}})인지 확인합니다."""
+    predictions = workflow_result.get("predictions") if isinstance(workflow_result, dict) else None
+    if (not isinstance(predictions, dict) or not isinstance(predictions.get("predictions"), list)
+            or not all(isinstance(obj, dict) for obj in predictions["predictions"])):
+        raise ApiError(422, "workflow_result에 predictions.predictions 목록이 없습니다.")
+    return workflow_result
+
+
+# --------------------------------------------------------------------------
+# 1. 단계별 처리
+# --------------------------------------------------------------------------
+def detect(payload: dict, client_id: str) -> dict:
+    _require(payload, "image_b64")
+    image_bytes = base64.b64decode(payload["image_b64"])
+    suffix = os.path.splitext(payload.get("filename") or "upload.jpg")[1] or ".jpg"
+    quality = check_image_quality(image_bytes) if preflight_enabled() else None
+    if quality and quality["result"] == REJECT:
+        if not payload.get("skip_quality_check"):
+            raise ApiError(422, " ".join(i["message"] for i in quality["issues"] if i["level"] == REJECT))
+        record_override()
+    # API 호출자는 세션이 없어 블롭 참조를 놓아 줄 시점이 없으므로 참조를 잡지 않습니다. (TTL로 정리)
+    workflow_result = detect_workflow(image_bytes, suffix=suffix, session_id=client_id, acquire=False)
+    return {"workflow_result": workflow_result, "screens": find_screens(workflow_result), "quality": quality}
+
+
+def _analysis_inputs(payload: dict):
+    _require(payload, "workflow_result", "monitor_inch")
+    workflow_result = _check_workflow_result(payload["workflow_result"])
+    try:
+        monitor_inch = float(payload["monitor_inch"])
+    except (TypeError, ValueError):
+        raise ApiError(400, "monitor_inch는 숫자여야 합니다.")
+    user_inputs = payload.get("user_inputs") or {}
+    if not isinstance(user_inputs, dict):
+        raise ApiError(400, "user_inputs는 객체여야 합니다.")
+    main_screen = payload.get("main_screen")
+    if main_screen is not None and not isinstance(main_screen, dict):
+        raise ApiError(400, "main_screen은 객체여야 합니다.")
+    if main_screen is None:
+        screens = find_screens(workflow_result)
+        try:
+            index = int(payload.get("main_screen_index", 0))
+        except (TypeError, ValueError):
+            raise ApiError(400, "main_screen_index는 정수여야 합니다.")
+        if not 0 <= index < len(screens):
+            raise ApiError(422, "❌ 스크린 또는 랩탑 객체가 감지되지 않았습니다." if not screens
+                           else f"main_screen_index가 범위를 벗어났습니다 (0~{len(screens) - 1}).")
+        main_screen = screens[index]
+    return workflow_result, main_screen, monitor_inch, user_inputs
+
+
+def analyze(payload: dict, client_id: str) -> dict:
+    result = run_analysis(*_analysis_inputs(payload), render=False)
+    return {"report": result["detailed_report"]}
+
+
+RENDER_FORMATS = ("png", "json", "svg")
+
+
+def render(payload: dict, client_id: str) -> dict:
+    fmt = payload.get("format") or "png"
+    if fmt not in RENDER_FORMATS:
+        raise ApiError(400, f"format은 {', '.join(RENDER_FORMATS)} 중 하나여야 합니다.")
+    if fmt != "png":
+        overlay = build_overlay(*_analysis_inputs(payload))
+        if overlay is None:
+            raise ApiError(422, "겹칠 워크플로우 결과 이미지(output_image)가 없습니다.")
+        if fmt == "json":
+            return {"overlay": overlay}
+        # NOTE: image_visualizer(PIL)는 렌더링 요청에서만 쓰므로 여기서 불러옵니다.
+        from image_visualizer import overlay_to_svg
+        return {"svg": overlay_to_svg(overlay)}
+    result = run_analysis(*_analysis_inputs(payload))
+    handle = result["feedback_image"]
+    if result["render_error"]:
+        raise ApiError(500, "피드백 이미지를 그리지 못했습니다.")
+    if handle is None:
+        raise ApiError(422, "그릴 워크플로우 결과 이미지(output_image)가 없습니다.")
+    return {"image_b64": base64.b64encode(get_blob_store().get(handle)).decode("ascii"), "handle": handle}
+
+
+def advise(payload: dict, client_id: str) -> dict:
+    _require(payload, "report")
+    if not isinstance(payload["report"], list):
+        raise ApiError(400, "report는 목록이어야 합니다.")
+    return {"advice": get_gpt_recommendation(payload["report"], session_id=client_id)}
+
+
+def run_all(payload: dict, client_id: str) -> dict:
+    detected = detect(payload, client_id)
+    payload = dict(payload, workflow_result=detected["workflow_result"])
+    # 리포트가 나오는 즉시 GPT 조언을 띄워 두고 피드백 이미지 렌더링과 동시에 진행합니다.
+    advice = []
+
+    def start_advice(report):
+        advice.append(submit_stage(get_gpt_recommendation, report, session_id=client_id))
+
+    result = run_analysis(*_analysis_inputs(payload), on_report=start_advice if payload.get("advice", True) else None)
+    report, handle = result["detailed_report"], result["feedback_image"]
+    response = {"workflow_result": detected["workflow_result"], "screens": detected["screens"], "report": report,
+                "feedback_image_b64": None}
+    image = get_blob_store().get(handle) if handle else None
+    if image is not None:
+        response["feedback_image_b64"] = base64.b64encode(image).decode("ascii")
+    if advice:
+        response["advice"] = advice[0].result()
+    return response
+
+
+ROUTES = {
+    "/v1/detect": detect,
+    "/v1/analyze": analyze,
+    "/v1/render": render,
+    "/v1/advise": advise,
+    "/v1/run": run_all,
+}
+
+
+# --------------------------------------------------------------------------
+# 2. HTTP 서버
+# --------------------------------------------------------------------------
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        handler = ROUTES.get(self.path.rstrip("/"))
+        if handler is None:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": "요청 본문이 너무 큽니다."})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "요청 본문은 JSON 객체여야 합니다."})
+            return
+
+        client_id = self.headers.get("X-Client-Id") or self.client_address[0]
+        if not _workers.acquire(timeout=API_QUEUE_TIMEOUT_SEC):
+            self._send_json(503, {"error": "서버가 바쁩니다. 잠시 후 다시 시도해주세요."})
+            return
+        try:
+            with span(f"api.{handler.__name__}"):
+                response = handler(payload, client_id)
+            self._send_json(200, response)
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except ValueError as e:
+            self._send_json(422, {"error": str(e)})
+        except (QueueFullError, TimeoutError) as e:
+            self._send_json(503, {"error": str(e)})
+        except Exception as e:
+            logger.exception("API 처리 실패: %s", self.path)
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            _workers.release()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8600) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="인체공학 분석 헤드리스 API 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(args.host, args.port)
+    logger.info("API 서버 실행 중: http://%s:%d (동시 처리 %d건)", args.host, args.port, API_WORKERS)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
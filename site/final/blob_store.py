@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+대용량 산출물(이미지 등)용 콘텐츠 주소 기반 디스크 블롭 저장소
+
+st.session_state에 워크플로우 응답의 base64 output_image, 미리보기/피드백 이미지를 그대로 두면
+세션 수만큼 서버 메모리(RSS)가 늘어납니다. 대신 바이트는 로컬 디스크에 한 번만 저장하고
+세션에는 짧은 핸들(sha256)만 둡니다.
+
+- 같은 내용은 같은 핸들이 되므로 여러 세션이 같은 이미지를 올려도 파일은 하나입니다.
+- 읽을 때 mmap=True면 메모리 매핑으로 읽어 페이지 캐시를 공유합니다.
+- 세션이 핸들을 잡으면(put/acquire) 참조 수가 늘고, 다시 분석하기 등으로 놓으면(release) 줄어듭니다.
+  참조가 0이 된 뒤 TTL이 지난 블롭은 정리됩니다. 세션이 release 없이 끝나는 경우에 대비해
+  참조가 남아 있어도 최대 보관 시간(max_age)이 지나면 정리합니다.
+- 공유 캐시(shared_cache)를 통해 핸들이 프로세스 사이에 오가므로, 참조 수는 프로세스마다 따로지만
+  "마지막 사용 시각"은 파일 수정 시각(mtime)으로 모든 프로세스가 함께 봅니다. 사용(put/get/acquire/release)할
+  때마다 mtime을 갱신하고, 참조를 잡고 있는 블롭은 정리 주기(EVICT_INTERVAL_SEC)마다 mtime을 다시 갱신합니다.
+  정리는 자기 프로세스의 참조가 0이고 파일 mtime이 TTL보다 오래된 블롭만 지우므로, 다른 프로세스가 잡고 있는
+  블롭은 지우지 않습니다. 다만 프로세스가 TTL보다 오래 아무 요청도 처리하지 않으면 갱신이 멈추므로,
+  읽는 쪽은 블롭이 없을 수 있음(get이 None)을 처리해야 합니다.
+- 분석 기록처럼 세션보다 오래 남아야 하는 블롭은 pin 합니다. pinned/ 아래에 하드 링크(안 되면 복사)를 두어
+  정리나 재시작과 관계없이 unpin 할 때까지 유지됩니다.
+
+환경변수로 설정할 수 있습니다.
+    BLOB_STORE_DIR      (기본: .cache/blobs)
+    BLOB_STORE_TTL_SEC  (기본: 1시간, 참조가 없는 블롭의 보관 시간)
+    BLOB_STORE_MAX_AGE  (기본: 1일, 참조와 관계없는 최대 보관 시간)
+"""
+import os
+import mmap
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOB_DIR = os.path.join(".cache", "blobs")
+DEFAULT_TTL_SEC = 60 * 60
+DEFAULT_MAX_AGE_SEC = 24 * 60 * 60
+EVICT_INTERVAL_SEC = 60
+PINNED_DIR = "pinned"
+
+
+class BlobStore:
+    def __init__(self, root: str = DEFAULT_BLOB_DIR, ttl_sec: float = DEFAULT_TTL_SEC,
+                 max_age_sec: float = DEFAULT_MAX_AGE_SEC):
+        self.root = root
+        self.ttl_sec = ttl_sec
+        self.max_age_sec = max_age_sec
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        # handle -> {"refs": 참조 수, "last_access": 마지막 사용 시각, "created_at": 생성 시각}
+        self._index: Dict[str, dict] = {}
+        self._last_evict = 0.0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """
+        재시작 후에는 이 프로세스의 세션도 없으므로 기존 블롭은 참조 0, 파일 수정 시각 기준으로 다시 등록합니다.
+        (다른 프로세스가 잡고 있는 블롭은 그 프로세스가 mtime을 계속 갱신하므로 정리되지 않습니다.)
+        """
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root and PINNED_DIR in dirnames:
+                dirnames.remove(PINNED_DIR)
+            for name in filenames:
+                if name.startswith("."):
+                    continue
+                mtime = os.path.getmtime(os.path.join(dirpath, name))
+                self._index[name] = {"refs": 0, "last_access": mtime, "created_at": mtime}
+
+    def _path(self, handle: str) -> str:
+        return os.path.join(self.root, handle[:2], handle)
+
+    def _pinned_path(self, handle: str) -> str:
+        return os.path.join(self.root, PINNED_DIR, handle)
+
+    def _touch(self, handle: str) -> None:
+        """모든 프로세스가 보는 마지막 사용 시각(파일 mtime)을 갱신합니다."""
+        try:
+            os.utime(self._path(handle))
+        except FileNotFoundError:
+            pass
+
+    def put(self, data: Union[bytes, bytearray, memoryview], acquire: bool = True) -> str:
+        """바이트를 저장하고 핸들을 반환합니다. 이미 있으면 쓰지 않습니다. acquire=True면 참조를 하나 잡습니다."""
+        handle = hashlib.sha256(data).hexdigest()
+        path = self._path(handle)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 다른 세션/프로세스가 부분적으로 쓰인 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체합니다.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        else:
+            self._touch(handle)
+        now = time.time()
+        with self._lock:
+            entry = self._index.setdefault(handle, {"refs": 0, "last_access": now, "created_at": now})
+            entry["last_access"] = now
+            if acquire:
+                entry["refs"] += 1
+        self._maybe_evict(now)
+        return handle
+
+    def get(self, handle: str, use_mmap: bool = False) -> Optional[Union[bytes, mmap.mmap]]:
+        """
+        핸들의 내용. 없으면 None.
+        use_mmap=True면 읽기 전용 mmap 객체(bytes처럼 슬라이스 가능)를 반환하며, 다 쓴 뒤 호출자가 close() 해야 합니다.
+        """
+        for path in (self._path(handle), self._pinned_path(handle)):
+            try:
+                with open(path, "rb") as f:
+                    if use_mmap and os.fstat(f.fileno()).st_size:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    else:
+                        data = f.read()
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            return None
+        self._touch(handle)
+        now = time.time()
+        with self._lock:
+            if handle in self._index:
+                self._index[handle]["last_access"] = now
+        self._maybe_evict(now)
+        return data
+
+    def exists(self, handle: Optional[str]) -> bool:
+        return bool(handle) and (os.path.exists(self._path(handle)) or os.path.exists(self._pinned_path(handle)))
+
+    def acquire(self, handle: str) -> None:
+        """참조를 하나 잡습니다. 다른 프로세스가 쓴 블롭(공유 캐시 적중 등)이면 색인에 등록합니다."""
+        self._touch(handle)
+        now = time.time()
+        with self._lock:
+            if handle not in self._index and os.path.exists(self._path(handle)):
+                self._index[handle] = {"refs": 0, "last_access": now, "created_at": now}
+            if handle in self._index:
+                self._index[handle]["refs"] += 1
+                self._index[handle]["last_access"] = now
+        self._maybe_evict(now)
+
+    def release(self, handle: Optional[str]) -> None:
+        if not handle:
+            return
+        self._touch(handle)
+        with self._lock:
+            entry = self._index.get(handle)
+            if entry and entry["refs"] > 0:
+                entry["refs"] -= 1
+                entry["last_access"] = time.time()
+
+    def pin(self, handle: str) -> bool:
+        """블롭을 정리 대상에서 영구히 뺍니다. 블롭이 이미 없으면 False."""
+        pinned = self._pinned_path(handle)
+        if os.path.exists(pinned):
+            return True
+        os.makedirs(os.path.dirname(pinned), exist_ok=True)
+        try:
+            os.link(self._path(handle), pinned)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            # 하드 링크를 지원하지 않는 파일 시스템
+            try:
+                shutil.copyfile(self._path(handle), pinned)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def unpin(self, handle: str) -> None:
+        """pin을 풉니다. 본 파일이 남아 있으면 평소처럼 TTL에 따라 정리됩니다."""
+        try:
+            os.remove(self._pinned_path(handle))
+        except FileNotFoundError:
+            pass
+
+    def _maybe_evict(self, now: float) -> None:
+        if now - self._last_evict >= EVICT_INTERVAL_SEC:
+            self._last_evict = now
+            self.evict(now)
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        이 프로세스의 참조가 없고 모든 프로세스 기준으로 TTL 동안 쓰이지 않았거나(파일 mtime),
+        최대 보관 시간이 지난 블롭을 지웁니다. 참조를 잡고 있는 블롭은 mtime을 갱신합니다. 지운 개수를 반환합니다.
+        """
+        now = now or time.time()
+        with self._lock:
+            held = [handle for handle, entry in self._index.items() if entry["refs"]]
+            candidates = [
+                (handle, now - entry["created_at"] > self.max_age_sec)
+                for handle, entry in self._index.items()
+                if (entry["refs"] == 0 and now - entry["last_access"] > self.ttl_sec)
+                or now - entry["created_at"] > self.max_age_sec
+            ]
+        for handle in held:
+            self._touch(handle)
+
+        expired = []
+        for handle, too_old in candidates:
+            try:
+                # 다른 프로세스가 최근에 쓴 블롭이면 남겨 둡니다.
+                if too_old or now - os.path.getmtime(self._path(handle)) > self.ttl_sec:
+                    os.remove(self._path(handle))
+                    expired.append(handle)
+            except FileNotFoundError:
+                expired.append(handle)
+        with self._lock:
+            for handle in expired:
+                entry = self._index.get(handle)
+                if entry is not None and (entry["refs"] == 0 or now - entry["created_at"] > self.max_age_sec):
+                    del self._index[handle]
+        if expired:
+            logger.info("블롭 %d개 정리", len(expired))
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"blobs": len(self._index), "referenced": sum(1 for e in self._index.values() if e["refs"])}
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """프로세스 공용 저장소 (환경변수 설정 사용)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore(
+                root=os.environ.get("BLOB_STORE_DIR", DEFAULT_BLOB_DIR),
+                ttl_sec=float(os.environ.get("BLOB_STORE_TTL_SEC", DEFAULT_TTL_SEC)),
+                max_age_sec=float(os.environ.get("BLOB_STORE_MAX_AGE", DEFAULT_MAX_AGE_SEC)),
+            )
+        return _store
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+저장된 분석 리포트에 대한 오프라인 대량 조언 생성 (야간 배치용 CLI)
+
+- 입력 디렉토리의 리포트 JSON(*.json, 리포트 리스트 또는 {"report": [...]} 형식)마다
+  같은 이름의 조언 파일(<이름>.advice.md)을 옆에 씁니다.
+- AsyncOpenAI로 동시 요청 수를 제한한 팬아웃(--concurrency)을 돌립니다.
+  OPENAI_BASE_URL을 바꾸면 OpenAI 호환 서버나 로컬 대역 서버(stand_in_servers.py)로 보낼 수 있습니다.
+- 정규화된 리포트 키가 같은 리포트는 한 번만 호출하고, 결과는 앱과 같은 조언 캐시(advice_cache)에 저장합니다.
+- 진행 상황을 체크포인트 파일(JSONL)에 기록하므로 중단 후 다시 실행하면 끝난 리포트는 건너뜁니다.
+
+    python bulk_advice.py reports/ --concurrency 8 --model gpt-3.5-turbo
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Optional
+
+# NOTE: OpenAI 라이브러리는 선택적입니다. 없으면 템플릿 조언만 쓸 수 있습니다(--template).
+try:
+    from openai import AsyncOpenAI
+except Exception:
+    AsyncOpenAI = None
+
+from advice_cache import make_advice_cache, make_report_key
+from advice_templates import generate_template_advice
+from prompt_builder import build_advice_prompt, log_token_usage
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = ".bulk_advice_checkpoint.jsonl"
+ADVICE_SUFFIX = ".advice.md"
+RATE_LIMIT_RETRIES = 5
+
+
+def load_report(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("report", []) if isinstance(data, dict) else data
+
+
+def find_reports(input_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.endswith(".json") and not name.startswith(".")
+    )
+
+
+def advice_path_for(report_path: str) -> str:
+    return os.path.splitext(report_path)[0] + ADVICE_SUFFIX
+
+
+class Checkpoint:
+    """끝난 리포트를 한 줄씩 덧붙여 기록합니다. 중간에 죽어도 마지막 줄까지는 유효합니다."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 기록 도중 중단된 마지막 줄
+                    if entry.get("status") == "done":
+                        self.done.add(entry["report"])
+
+    def mark(self, report_path: str, status: str, **extra) -> None:
+        entry = {"report": os.path.basename(report_path), "status": status, "at": time.time(), **extra}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if status == "done":
+            self.done.add(entry["report"])
+
+
+async def _request_advice(client, model: str, messages: list) -> str:
+    """제공자 rate limit(429)에 걸리면 지수 백오프로 다시 시도합니다."""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            response = await client.chat.completions.create(
+                model=model, messages=messages, temperature=0.7, max_tokens=1024, timeout=60)
+            log_token_usage("bulk-advice", messages, response.usage)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            if type(e).__name__ != "RateLimitError" or attempt == RATE_LIMIT_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+
+async def run_bulk(input_dir: str, model: str, concurrency: int, use_template: bool = False) -> Dict[str, int]:
+    checkpoint = Checkpoint(os.path.join(input_dir, CHECKPOINT_NAME))
+    pending = [p for p in find_reports(input_dir) if os.path.basename(p) not in checkpoint.done]
+    stats = {"total": len(pending), "done": 0, "cached": 0, "failed": 0, "calls": 0}
+    if not pending:
+        logger.info("새로 처리할 리포트가 없습니다.")
+        return stats
+
+    cache, client = None, None
+    if not use_template:
+        cache = make_advice_cache()
+        if AsyncOpenAI is None:
+            raise RuntimeError("openai 라이브러리가 없습니다. --template 옵션으로 템플릿 조언을 생성할 수 있습니다.")
+        client = AsyncOpenAI(base_url=os.environ.get("OPENAI_BASE_URL"))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    calls: Dict[str, asyncio.Task] = {}  # 같은 키의 리포트는 호출 하나를 함께 기다립니다.
+
+    async def advise(key: str, messages: list) -> str:
+        async with semaphore:
+            stats["calls"] += 1
+            text = await _request_advice(client, model, messages)
+        if cache and text:
+            cache.put(key, text)
+        return text
+
+    async def process(report_path: str) -> None:
+        try:
+            report = load_report(report_path)
+            if use_template:
+                text = generate_template_advice(report)
+            else:
+                key = cache.key_for(report, model) if cache else make_report_key(report, model)
+                text = cache.get(key) if cache else None
+                if text is not None:
+                    stats["cached"] += 1
+                else:
+                    if key not in calls:
+                        calls[key] = asyncio.ensure_future(advise(key, build_advice_prompt(report)))
+                    text = await calls[key]
+            with open(advice_path_for(report_path), "w", encoding="utf-8") as f:
+                f.write(text)
+        except Exception as e:
+            stats["failed"] += 1
+            logger.error("조언 생성 실패: %s (%s: %s)", report_path, type(e).__name__, e)
+            checkpoint.mark(report_path, "failed", error=f"{type(e).__name__}: {e}")
+            return
+        stats["done"] += 1
+        checkpoint.mark(report_path, "done")
+        if stats["done"] % 50 == 0:
+            logger.info("진행: %d/%d", stats["done"], stats["total"])
+
+    await asyncio.gather(*(process(p) for p in pending))
+    if client is not None:
+        await client.close()
+    return stats
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="저장된 분석 리포트에 대한 대량 조언 생성")
+    parser.add_argument("input_dir", help="리포트 JSON 파일들이 있는 디렉토리")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시에 보낼 최대 GPT 요청 수")
+    parser.add_argument("--template", action="store_true", help="GPT 대신 로컬 템플릿 조언으로 생성")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    stats = asyncio.run(run_bulk(args.input_dir, args.model, max(1, args.concurrency), args.template))
+    logger.info("완료: %s (%.1f초)", stats, time.perf_counter() - started)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+인체공학 분석 엔진 (final_app에서 분리)
+
+Streamlit UI와 헤드리스 API(api_server)가 같은 규칙으로 분석하도록 감지 결과 정리, 메인 스크린 매칭,
+ErgonomicsAnalyzer를 한 모듈에 둡니다.
+"""
+import math
+import re
+from typing import Callable, Optional, Tuple
+
+from tracing import span
+from metrics import ANALYZER_RULE_RUNS
+
+# 👤 1. 공통 헬퍼 함수 (Helper Functions)
+def find_object(yolo_output, class_name):
+    """YOLO 결과에서 특정 클래스의 첫 번째 객체를 반환 (없으면 None)"""
+    return next((obj for obj in yolo_output if obj['class'] == class_name), None)
+
+
+def get_object_side(obj_x, image_width):
+    """객체의 X 좌표를 기준으로 화면 내 위치(왼쪽/오른쪽/중앙) 판단"""
+    if obj_x < image_width / 3:
+        return "left"
+    elif obj_x > image_width * 2 / 3:
+        return "right"
+    else:
+        return "center"
+
+
+def _monitor_real_height_cm(inch, aspect_w=16, aspect_h=9):
+    """모니터 인치와 화면비로 실제 모니터 세로 길이(cm)를 계산"""
+    diag_cm = inch * 2.54
+    return diag_cm * (aspect_h / math.sqrt(aspect_w ** 2 + aspect_h ** 2))
+
+
+def parse_inch_from_string(size_str):
+    """문자열에서 숫자(인치)를 파싱합니다. (예: "15.6인치" -> 15.6)"""
+    size_str = str(size_str)  # 숫자형이 들어올 경우를 대비해 문자열로 변환
+    if not isinstance(size_str, str): return None
+    numbers = re.findall(r"(\d+\.?\d*)", size_str)
+    return float(numbers[0]) if numbers else None
+
+
+def calculate_ideal_screen_height(user_height_cm, user_gender):
+    """사용자 키와 성별 기반 이상적인 화면 상단 높이(cm) 계산"""
+    if user_gender == 'male':
+        return ((3.32 * user_height_cm) - 25.50) / 10
+    elif user_gender == 'female':
+        return ((2.61 * user_height_cm) + 93.84) / 10
+    else:
+        return ((2.96 * user_height_cm) + 34.17) / 10
+
+
+def check_proximity(upper_box, lower_box, threshold_px=100):
+    """위쪽 객체가 아래쪽 객체 바로 위에 있는지 Y축 및 X축 기준으로 확인"""
+    upper_bottom_y = upper_box['y'] + upper_box['height'] / 2
+    lower_top_y = lower_box['y'] - lower_box['height'] / 2
+    horizontal_distance = abs(upper_box['x'] - lower_box['x'])
+    horizontal_alignment_threshold = (upper_box['width'] + lower_box['width']) / 4
+    is_vertically_close = abs(upper_bottom_y - lower_top_y) < threshold_px
+    is_horizontally_aligned = horizontal_distance < horizontal_alignment_threshold
+    return is_vertically_close and is_horizontally_aligned
+
+
+# 🧐 2. 인체공학 진단 분석 클래스 (ErgonomicsAnalyzer Class)
+class ErgonomicsAnalyzer:
+    def __init__(self, yolo_output, user_inputs, image_width_px=1280):
+        self.yolo_output = yolo_output
+        self.user_inputs = user_inputs
+        self.image_width_px = image_width_px
+        self.report = []
+        self.severity_map = {"High": "High", "Moderate": "Moderate", "Low": "Low"}
+        self.main_screen = None
+        self.px_to_cm_ratio = None
+
+    def _estimate_desk_y(self):
+        """키보드, 마우스 등 책상 위 객체들의 하단 좌표 평균으로 책상 높이를 추정"""
+        bottom_y_coords = []
+        for class_name in ['keyboard', 'mouse', 'wrist_rest', 'monitor support']:
+            obj = find_object(self.yolo_output, class_name)
+            if obj:
+                bottom_y_coords.append(obj['box']['y'] + obj['box']['height'] / 2)
+        laptop = find_object(self.yolo_output, 'laptop')
+        support = find_object(self.yolo_output, 'monitor support')
+        if laptop and not (support and check_proximity(laptop['box'], support['box'])):
+            bottom_y_coords.append(laptop['box']['y'] + laptop['box']['height'] / 2)
+        return sum(bottom_y_coords) / len(bottom_y_coords) if bottom_y_coords else None
+
+    def _analyze_screen_height(self, screen_obj, details={}):
+        """스크린 객체의 높이를 분석하는 공통 로직"""
+        if self.px_to_cm_ratio is None: return
+        user_height_cm = self.user_inputs.get("user_height_cm")
+        gender = self.user_inputs.get("gender")
+        if not all([user_height_cm, gender]): return
+
+        desk_y = self._estimate_desk_y() or (screen_obj['box']['y'] + screen_obj['box']['height'] / 2.0)
+        ideal_height_cm = calculate_ideal_screen_height(user_height_cm, gender)
+        screen_top_y = screen_obj['box']['y'] - screen_obj['box']['height'] / 2.0
+        distance_px = desk_y - screen_top_y
+        estimated_actual_height_cm = round(distance_px * self.px_to_cm_ratio, 1)
+        delta = round(estimated_actual_height_cm - ideal_height_cm, 1)
+        abs_delta = abs(delta)
+
+        severity = self.severity_map["Low"]
+        if abs_delta > 15:
+            severity = self.severity_map["High"]
+        elif abs_delta > 5:
+            severity = self.severity_map["Moderate"]
+
+        details.update({
+            "delta_cm": delta, "ideal_height_cm": ideal_height_cm,
+            "estimated_actual_height_cm": estimated_actual_height_cm
+        })
+        self.report.append(
+            {"problem_id": f"{screen_obj['class'].upper()}_HEIGHT", "severity": severity, "details": details})
+
+    def detect_screens(self):
+        """감지된 모든 스크린 객체에 고유 ID를 부여하여 리스트로 반환"""
+        screens = [obj for obj in self.yolo_output if obj['class'] in ['screen', 'laptop', 'monitor']]
+        for i, screen in enumerate(screens):
+            if 'id' not in screen:  # ID가 이미 부여되었다면 그대로 사용
+                screen['id'] = f"screen_{i}"
+        return screens
+
+    def set_main_screen_by_id(self, screen_id, main_screen_inch_str):
+        """ID와 인치 정보로 메인 스크린을 설정하고, px_to_cm_ratio를 계산"""
+        screens = self.detect_screens()
+        selected_screen = next((s for s in screens if s.get('id') == screen_id), None)
+
+        if selected_screen and selected_screen.get('box'):
+            self.main_screen = selected_screen
+            self.user_inputs['main_screen_inch'] = main_screen_inch_str
+            main_screen_inch = parse_inch_from_string(main_screen_inch_str)
+            if main_screen_inch and self.main_screen['box']['height'] > 0:
+                real_h_cm = _monitor_real_height_cm(main_screen_inch)
+                self.px_to_cm_ratio = real_h_cm / self.main_screen['box']['height']
+            return True
+        return False
+
+    def analyze_screen_setup(self):
+        screen = find_object(self.yolo_output, "screen") or find_object(self.yolo_output, "monitor")
+        if screen:
+            support = find_object(self.yolo_output, 'monitor support')
+            has_support = support and check_proximity(screen.get('box', {}), support.get('box', {}))
+            self._analyze_screen_height(screen, {"has_support": bool(has_support)})
+
+    def analyze_laptop_setup(self):
+        laptop = find_object(self.yolo_output, "laptop")
+        if laptop:
+            support = find_object(self.yolo_output, 'monitor support')
+            details = {
+                "has_support": support and check_proximity(laptop.get('box', {}), support.get('box', {})),
+                "has_external_keyboard": find_object(self.yolo_output, 'keyboard') is not None
+            }
+            self._analyze_screen_height(laptop, details)
+
+    def analyze_wrist_rest(self):
+        has_wrist_rest = find_object(self.yolo_output, "wrist_rest") is not None
+        severity = self.severity_map["Low"] if has_wrist_rest else self.severity_map["High"]
+        self.report.append(
+            {"problem_id": "WRIST_REST_PRESENCE", "severity": severity, "details": {"has_wrist_rest": has_wrist_rest}})
+
+    def analyze_light_position(self):
+        lamp = find_object(self.yolo_output, "desk lamp")
+        if not lamp: return
+        handedness = self.user_inputs.get("handedness", "오른손잡이")
+        lamp_side = get_object_side(lamp['box']['x'], self.image_width_px)
+        is_misaligned = (handedness == "왼손잡이" and lamp_side == "left") or (
+                handedness == "오른손잡이" and lamp_side == "right")
+        severity = self.severity_map["Moderate"] if is_misaligned else self.severity_map["Low"]
+        self.report.append({"problem_id": "LIGHT_POSITION", "severity": severity,
+                            "details": {"handedness": handedness, "lamp_side": lamp_side}})
+
+    def analyze_keyboard_mouse_distance(self):
+        if self.px_to_cm_ratio is None: return
+        keyboard = find_object(self.yolo_output, "keyboard")
+        mouse = find_object(self.yolo_output, "mouse")
+        gender = self.user_inputs.get("gender")
+        if not all([keyboard, mouse, gender]): return
+        distance_cm = abs(keyboard['box']['x'] - mouse['box']['x']) * self.px_to_cm_ratio
+        threshold_cm = 15 if gender == 'male' else 10
+        severity = self.severity_map["High"] if distance_cm > threshold_cm else self.severity_map["Low"]
+        self.report.append({"problem_id": "KEYBOARD_MOUSE_DISTANCE", "severity": severity,
+                            "details": {"actual_distance_cm": round(distance_cm, 1), "threshold_cm": threshold_cm}})
+
+    def analyze_keyboard_mouse_alignment(self):
+        keyboard = find_object(self.yolo_output, "keyboard")
+        mouse = find_object(self.yolo_output, "mouse")
+        if not all([keyboard, mouse]): return
+        kbd_box = keyboard['box']
+        mouse_center_y = mouse['box']['y']
+        ky_min = kbd_box['y'] - kbd_box['height'] / 2
+        ky_max = kbd_box['y'] + kbd_box['height'] / 2
+        is_vertically_aligned = (ky_min <= mouse_center_y <= ky_max)
+        severity = self.severity_map["Moderate"] if not is_vertically_aligned else self.severity_map["Low"]
+        self.report.append({"problem_id": "KEYBOARD_MOUSE_ALIGNMENT", "severity": severity,
+                            "details": {"is_vertically_aligned": is_vertically_aligned}})
+
+    def analyze_window_position(self):
+        if self.main_screen is None or self.px_to_cm_ratio is None: return
+        window = find_object(self.yolo_output, "window")
+        if not window: return
+        horizontal_distance_px = abs(self.main_screen['box']['x'] - window['box']['x'])
+        horizontal_distance_cm = round(horizontal_distance_px * self.px_to_cm_ratio, 1)
+        severity = self.severity_map["Moderate"] if horizontal_distance_cm <= 50 else self.severity_map["Low"]
+        self.report.append({"problem_id": "WINDOW_POSITION", "severity": severity,
+                            "details": {"horizontal_distance_cm": horizontal_distance_cm}})
+
+    def analyze_viewing_distance_by_ratio(self):
+        if not self.main_screen: return
+        ratio = self.main_screen['box']['width'] / self.image_width_px
+        severity = self.severity_map["Low"]
+        if ratio > 0.50:
+            severity = self.severity_map["High"]
+        elif ratio < 0.40:
+            severity = self.severity_map["Moderate"]
+        self.report.append({"problem_id": "VIEWING_DISTANCE", "severity": severity,
+                            "details": {"main_screen_type": self.main_screen['class'],
+                                        "screen_width_ratio": f"{ratio:.1%}"}})
+
+    def run_all_analyses(self):
+        """모든 분석을 순차적으로 실행합니다."""
+        if not self.main_screen:
+            raise ValueError("메인 스크린이 설정되지 않았습니다. set_main_screen_by_id()를 먼저 호출해주세요.")
+
+        rules = [
+            self.analyze_screen_setup,
+            self.analyze_laptop_setup,
+            self.analyze_wrist_rest,
+            self.analyze_light_position,
+            self.analyze_keyboard_mouse_distance,
+            self.analyze_keyboard_mouse_alignment,
+            self.analyze_window_position,
+            self.analyze_viewing_distance_by_ratio,
+        ]
+        for rule in rules:
+            outcome = "error"
+            try:
+                with span(f"analyzer.rule.{rule.__name__}"):
+                    rule()
+                outcome = "ok"
+            finally:
+                ANALYZER_RULE_RUNS.inc(rule=rule.__name__, outcome=outcome)
+
+        return self.report
+
+
+# --------------------------------------------------------------------------
+# 3. 워크플로우 결과 → 분석 리포트
+# --------------------------------------------------------------------------
+def normalize_detections(workflow_result: dict) -> Tuple[list, int]:
+    """Roboflow 워크플로우 결과를 분석기 입력 형식(class/confidence/box)으로 바꾸고 이미지 폭과 함께 반환합니다."""
+    with span("detection.normalize"):
+        raw_detections = workflow_result.get("predictions", {}).get("predictions", [])
+        image_width = workflow_result.get("image", {}).get("width", 1280)
+
+        yolo_results = []
+        for det in raw_detections:
+            yolo_results.append({
+                "class": det.get("class"), "confidence": det.get("confidence"),
+                "box": {"x": det.get("x"), "y": det.get("y"), "width": det.get("width"),
+                        "height": det.get("height")}
+            })
+    return yolo_results, image_width
+
+
+def match_main_screen(yolo_results: list, main_screen_raw: dict) -> Optional[str]:
+    """사용자가 고른 메인 스크린(원본 예측)과 같은 객체에 id를 붙이고 그 id를 반환합니다. 없으면 None."""
+    with span("analysis.main_screen_match"):
+        for i, det in enumerate(yolo_results):
+            if (det['box']['x'] == main_screen_raw.get('x') and
+                    det['box']['y'] == main_screen_raw.get('y') and
+                    det['class'] == main_screen_raw.get('class')):
+                det['id'] = f"screen_{i}"
+                return f"screen_{i}"
+    return None
+
+
+def analyze_workflow_result(workflow_result: dict, main_screen_raw: dict, main_screen_inch, user_inputs: dict,
+                            on_stage: Optional[Callable[[str], None]] = None) -> Tuple[list, "ErgonomicsAnalyzer"]:
+    """감지 결과 정리 → 메인 스크린 매칭 → 규칙 분석. (리포트, 분석기)를 반환합니다."""
+    if on_stage:
+        on_stage("normalize")
+    yolo_results, image_width = normalize_detections(workflow_result)
+    main_screen_id = match_main_screen(yolo_results, main_screen_raw)
+    if not main_screen_id:
+        raise ValueError("메인 스크린의 고유 ID를 생성하는데 실패했습니다.")
+
+    if on_stage:
+        on_stage("analyze")
+    with span("analysis.total"):
+        analyzer = ErgonomicsAnalyzer(yolo_results, user_inputs, image_width)
+        analyzer.set_main_screen_by_id(main_screen_id, str(main_screen_inch))
+        analysis_report = analyzer.run_all_analyses()
+    return analysis_report, analyzer
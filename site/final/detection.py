@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Roboflow 워크플로우 감지 호출 (yolo_detector_v4 페이지와 헤드리스 API가 함께 사용)
+
+- InferenceHTTPClient는 API 키별로 프로세스당 하나만 만들어 재사용합니다. (연결 풀 공유)
+  inference_sdk는 import 비용이 커서 첫 감지 요청 때 불러옵니다.
+- 호출 전에 전역 감지 대기열(rate_limiter "DETECTION")의 차례를 기다립니다.
+- ROBOFLOW_API_URL로 로컬 대역 서버(stand_in_servers.py)를 가리킬 수 있습니다.
+- detect_workflow()는 이미지 내용으로 공유 캐시(shared_cache)를 먼저 찾아, 다른 워커 프로세스가 이미 감지한
+  같은 사진이면 호출하지 않습니다.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from rate_limiter import get_limiter
+from tracing import span
+from metrics import DETECTION_REQUESTS
+from blob_store import get_blob_store
+from pipeline import compact_workflow_result
+from shared_cache import get_shared_cache, make_key
+
+if TYPE_CHECKING:
+    from inference_sdk import InferenceHTTPClient
+
+ROBOFLOW_API_URL = os.environ.get("ROBOFLOW_API_URL", "https://serverless.roboflow.com")
+WORKSPACE_NAME = "yujin-qkjrt"
+WORKFLOW_ID = "detect-count-and-visualize-14"
+SCREEN_CLASSES = ("screen", "monitor", "laptop")
+
+_clients: Dict[str, "InferenceHTTPClient"] = {}
+_clients_lock = threading.Lock()
+
+
+def get_detection_client(api_key: Optional[str] = None) -> "InferenceHTTPClient":
+    api_key = api_key or os.environ.get("ROBOFLOW_API_KEY")
+    if not api_key:
+        raise RuntimeError("ROBOFLOW_API_KEY가 설정되지 않았습니다.")
+    with _clients_lock:
+        if api_key not in _clients:
+            from inference_sdk import InferenceHTTPClient
+
+            _clients[api_key] = InferenceHTTPClient(api_url=ROBOFLOW_API_URL, api_key=api_key)
+        return _clients[api_key]
+
+
+def request_workflow(image_bytes: bytes, suffix: str = ".jpg", session_id: str = "default",
+                     on_wait: Optional[Callable[[int], None]] = None, api_key: Optional[str] = None) -> list:
+    """이미지 바이트로 워크플로우를 실행하고 원본 응답(outputs 리스트)을 반환합니다."""
+    client = get_detection_client(api_key)
+
+    # 이미지 임시 저장
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_file.write(image_bytes)
+        temp_path = temp_file.name
+
+    try:
+        with span("detection.queue_wait"):
+            get_limiter("DETECTION").acquire(session_id, on_wait=on_wait)
+        with span("detection.request"):
+            try:
+                result = client.run_workflow(
+                    workspace_name=WORKSPACE_NAME,
+                    workflow_id=WORKFLOW_ID,
+                    images={"image": temp_path},
+                    use_cache=True
+                )
+            except Exception:
+                DETECTION_REQUESTS.inc(outcome="error")
+                raise
+        DETECTION_REQUESTS.inc(outcome="ok")
+        return result
+    finally:
+        os.remove(temp_path)
+
+
+def detect_workflow(image_bytes: bytes, suffix: str = ".jpg", session_id: str = "default",
+                    on_wait: Optional[Callable[[int], None]] = None, api_key: Optional[str] = None,
+                    acquire: bool = True) -> dict:
+    """
+    세션/응답에 둘 압축된 워크플로우 결과(compact_workflow_result)를 반환합니다.
+    acquire=True면 결과 이미지 핸들은 호출자 몫으로 참조를 하나 잡아 둡니다. (캐시 적중이어도 같음)
+    세션이 없는 호출자(API)는 acquire=False로 호출해 참조 없이 TTL에 맡깁니다.
+    """
+    cache = get_shared_cache()
+    key = make_key("detection", WORKSPACE_NAME, WORKFLOW_ID, hashlib.sha256(image_bytes).hexdigest())
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        # 결과 이미지가 블롭 저장소에서 이미 정리됐으면 다시 감지합니다.
+        handle = cached.get("output_image_handle")
+        store = get_blob_store()
+        if not handle or store.exists(handle):
+            if handle and acquire:
+                store.acquire(handle)
+            return cached
+
+    result = request_workflow(image_bytes, suffix=suffix, session_id=session_id, on_wait=on_wait, api_key=api_key)
+    workflow_result = compact_workflow_result(result[0], acquire=acquire)
+    if cache:
+        cache.put(key, workflow_result)
+    return workflow_result
+
+
+def find_screens(workflow_result: dict) -> list:
+    """워크플로우 결과에서 화면 관련 객체(스크린/모니터/랩탑)만 골라냅니다."""
+    with span("detection.parse"):
+        detections = workflow_result["predictions"]["predictions"]
+        return [obj for obj in detections if obj.get("class") in SCREEN_CLASSES]
@@ -1,8 +1,17 @@
 import streamlit as st
 import json
-import time
+import textwrap
+import hashlib
+import logging
 import openai  # GPT API 사용을 위해 추가
 
+from prompt_builder import count_tokens, get_token_budget, log_token_usage
+from advice_service import get_advice_service
+from rate_limiter import get_limiter, current_session_id, QueueFullError
+from tracing import artificial_wait
+
+logger = logging.getLogger(__name__)
+
 
 # -------------------------------------------------------------------
 # 1. 인체공학 규칙 엔진 및 프롬프트 생성기
@@ -66,11 +75,22 @@ def generate_gpt_prompt(user_data, problems):
     사용자 정보(user_data)와 분석된 문제점(problems)을 결합하여
     GPT에게 전달할 최종 프롬프트를 생성하는 함수.
     """
-    # GPT가 더 잘 이해할 수 있도록 정보를 문자열로 변환
-    user_data_str = json.dumps(user_data, ensure_ascii=False, indent=2)
-    problems_str = str(problems)
-
-    prompt = f"""
+    # 들여쓰기/공백 없이 압축 직렬화해 입력 토큰을 줄입니다.
+    user_data_str = json.dumps(user_data, ensure_ascii=False, separators=(",", ":"))
+    budget = get_token_budget()
+    problems = list(problems)
+    while True:
+        problems_str = "\n".join(f"- {p}" for p in problems)
+        prompt = GPT_PROMPT_TEMPLATE.format(user_data_str=user_data_str, problems_str=problems_str)
+        # 예산을 넘으면 뒤쪽 문제점부터 덜어냅니다 (최소 1개는 유지).
+        if count_tokens(prompt) <= budget or len(problems) <= 1:
+            return prompt
+        logger.info("프롬프트가 토큰 예산(%d)을 넘어 문제점 %d개 중 마지막 항목을 제외합니다.", budget, len(problems))
+        problems.pop()
+
+
+# 줄마다 붙은 4칸 들여쓰기도 모두 토큰이므로 템플릿을 정의할 때 한 번만 제거합니다.
+GPT_PROMPT_TEMPLATE = textwrap.dedent("""
     # ROLE (역할)
     너는 세계 최고의 인체공학 컨설턴트다. 너의 임무는 사용자의 건강과 생산성을 높이기 위해, 데이터를 기반으로 한 개인 맞춤형 책상 배치 솔루션을 제공하는 것이다.
 
@@ -96,8 +116,7 @@ def generate_gpt_prompt(user_data, problems):
     # FORMAT (형식)
     - 전체적으로 친절하고 격려하는 전문가의 톤을 유지해줘.
     - Markdown을 사용해서 제목, 부제목, 글머리 기호로 가독성 좋게 정리해줘.
-    """
-    return prompt
+    """).strip()
 
 
 # -------------------------------------------------------------------
@@ -130,17 +149,27 @@ def call_gpt_api_with_prompt(prompt):
         if not api_key:
             return "오류: OpenAI API 키가 설정되지 않았습니다. (st.secrets)"
 
-        client = openai.OpenAI(api_key=api_key)
-
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",  # 또는 "gpt-3.5-turbo"
-            messages=[
-                {"role": "system", "content": "You are a helpful ergonomic consultant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content
-
+        service = get_advice_service(api_key)
+        if service is None:
+            return "오류: OpenAI 클라이언트를 초기화할 수 없습니다."
+
+        model = "gpt-4-turbo"  # 또는 "gpt-3.5-turbo"
+        messages = [
+            {"role": "system", "content": "You are a helpful ergonomic consultant."},
+            {"role": "user", "content": prompt}
+        ]
+        # 같은 프롬프트의 동시 요청은 업스트림 호출 하나를 공유합니다.
+        key = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+        if not service.is_in_flight(key):
+            get_limiter("GPT").acquire(current_session_id())
+        flight = service.start(key, model, messages, timeout=60)
+        text = flight.result(timeout=60)
+        log_token_usage("gpt.py", messages, flight.usage)
+        return text
+
+    except QueueFullError:
+        st.warning("현재 AI 요청이 많습니다. 잠시 후 다시 시도해주세요.")
+        return "오류: 요청이 많아 AI 권장사항을 생성하지 못했습니다. 잠시 후 다시 시도해주세요."
     except openai.AuthenticationError:
         st.error("OpenAI API 키가 유효하지 않습니다.")
         return "오류: OpenAI API 키 인증에 실패했습니다."
@@ -214,12 +243,12 @@ def page4_analysis_in_progress():
     # st.session_state에 'analysis_result'가 이미 있으면 이 페이지를 스킵
     if 'analysis_result' in st.session_state:
         st.warning("이미 분석이 완료되었습니다. 결과 페이지(P5)로 이동합니다.")
-        time.sleep(1)
+        artificial_wait(1, "page4.already_done_notice")
         go_to_page(5)
         return
 
     with st.spinner("기본 인체공학 분석 중... (규칙 엔진 실행)"):
-        time.sleep(1)  # 시각적 효과를 위한 최소 대기
+        artificial_wait(1, "page4.spinner_min_wait")  # 시각적 효과를 위한 최소 대기
 
         # 'user_analysis' 세션 데이터가 있는지 확인
         if 'user_analysis' not in st.session_state:
@@ -233,7 +262,7 @@ def page4_analysis_in_progress():
         final_solution_text, analysis_report = run_analysis_pipeline(st.session_state['user_analysis'])
 
         st.success("기본 분석이 완료되었습니다!")
-        time.sleep(0.5)
+        artificial_wait(0.5, "page4.success_pause")
 
     # 세션 상태에 결과 저장
     st.session_state['analysis_result'] = final_solution_text  # 기본 결과 (GPT 건너뛸 시 사용)
@@ -255,7 +284,7 @@ def page4_analysis_in_progress():
                 st.session_state['analysis_result'] = gpt_text
 
             st.success("AI 권장사항 생성 완료!")
-            time.sleep(0.5)
+            artificial_wait(0.5, "page4.gpt_success_pause")
             go_to_page(5)
 
     with col2:
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+감지 호출 전 로컬 사진 품질 검사 (pre-flight)
+
+흐리거나 어둡거나 너무 작은 사진도 그대로 run_workflow로 보내 왕복 비용을 낸 뒤
+"❌ 스크린 또는 랩탑 객체가 감지되지 않았습니다"로 실패하곤 했습니다. 감지 전에 작은 썸네일로
+몇 ms 안에 검사해 명백히 안 되는 사진은 막고, 애매한 사진은 경고만 합니다.
+
+- 해상도: 원본 크기 (짧은 변 기준)
+- 흐림: 흑백 썸네일의 라플라시안 분산 (값이 작을수록 경계가 흐림)
+- 노출: 밝기 평균과 거의 검은/흰 픽셀 비율
+- 책상 사진인지 여부는 로컬에서 판단하지 않습니다. (감지 결과로 판단)
+
+막은 횟수는 preflight_checks_total{result="reject"}, 사용자가 "그래도 감지하기"로 넘긴 횟수는
+preflight_overrides_total 지표로 남습니다. 아낀 감지 호출 수는 그 차이입니다. (saved_detection_calls)
+
+환경변수로 설정할 수 있습니다.
+    PREFLIGHT_CHECK  (기본: 1, 0이면 검사하지 않음)
+"""
+import os
+import time
+import logging
+from io import BytesIO
+from typing import Dict, List
+
+from metrics import PREFLIGHT_CHECKS, PREFLIGHT_OVERRIDES
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = 256
+MIN_SIDE_REJECT = 320
+MIN_SIDE_WARN = 640
+BLUR_REJECT = 15.0
+BLUR_WARN = 60.0
+BRIGHTNESS_REJECT = (30, 235)
+BRIGHTNESS_WARN = (55, 215)
+CLIPPED_WARN = 0.5
+
+PASS, WARN, REJECT = "pass", "warn", "reject"
+
+
+def preflight_enabled() -> bool:
+    return os.environ.get("PREFLIGHT_CHECK", "1").strip().lower() not in ("0", "false", "no")
+
+
+def laplacian_variance(gray) -> float:
+    """흑백 배열(2차원)의 4-이웃 라플라시안 분산."""
+    import numpy as np
+
+    a = np.asarray(gray, dtype=np.float32)
+    if a.shape[0] < 3 or a.shape[1] < 3:
+        return 0.0
+    lap = a[:-2, 1:-1] + a[2:, 1:-1] + a[1:-1, :-2] + a[1:-1, 2:] - 4 * a[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def check_image_quality(image_bytes: bytes) -> Dict:
+    """
+    {"result": pass|warn|reject, "issues": [{"code", "level", "message"}], "metrics": {...}, "ms"}
+    이미지를 열 수 없으면 reject 입니다.
+    """
+    # NOTE: PIL/numpy는 감지 페이지에서만 쓰므로 처음 검사할 때 불러옵니다.
+    import numpy as np
+    from PIL import Image
+
+    started = time.perf_counter()
+    issues: List[Dict] = []
+
+    def issue(code: str, level: str, message: str):
+        issues.append({"code": code, "level": level, "message": message})
+
+    try:
+        image = Image.open(BytesIO(image_bytes))
+        width, height = image.size
+        # JPEG는 디코딩 단계에서 바로 축소해 원본 전체를 풀지 않습니다.
+        image.draft("L", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        gray = image.convert("L")
+        gray.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    except Exception as e:
+        issue("unreadable", REJECT, f"이미지를 열 수 없습니다: {e}")
+        return _finish(issues, {}, started)
+
+    pixels = np.asarray(gray, dtype=np.uint8)
+    histogram = np.bincount(pixels.ravel(), minlength=256)
+    total = max(int(histogram.sum()), 1)
+    brightness = float((histogram * np.arange(256)).sum() / total)
+    dark_ratio = float(histogram[:16].sum() / total)
+    bright_ratio = float(histogram[240:].sum() / total)
+    sharpness = laplacian_variance(pixels)
+    metrics = {"width": width, "height": height, "sharpness": round(sharpness, 1),
+               "brightness": round(brightness, 1), "dark_ratio": round(dark_ratio, 3),
+               "bright_ratio": round(bright_ratio, 3)}
+
+    short_side = min(width, height)
+    if short_side < MIN_SIDE_REJECT:
+        issue("resolution", REJECT, f"사진이 너무 작습니다 ({width}×{height}). 짧은 변이 {MIN_SIDE_WARN}px 이상인 사진을 올려주세요.")
+    elif short_side < MIN_SIDE_WARN:
+        issue("resolution", WARN, f"사진 해상도가 낮아 ({width}×{height}) 작은 물체를 놓칠 수 있습니다.")
+
+    if sharpness < BLUR_REJECT:
+        issue("blur", REJECT, "사진이 많이 흐립니다. 초점을 맞춰 다시 찍어주세요.")
+    elif sharpness < BLUR_WARN:
+        issue("blur", WARN, "사진이 약간 흐립니다. 감지 정확도가 떨어질 수 있습니다.")
+
+    if brightness < BRIGHTNESS_REJECT[0]:
+        issue("exposure", REJECT, "사진이 너무 어둡습니다. 조명을 켜고 다시 찍어주세요.")
+    elif brightness > BRIGHTNESS_REJECT[1]:
+        issue("exposure", REJECT, "사진이 너무 밝습니다(과노출). 역광을 피해 다시 찍어주세요.")
+    elif brightness < BRIGHTNESS_WARN[0] or dark_ratio > CLIPPED_WARN:
+        issue("exposure", WARN, "사진이 어두운 편입니다. 감지 정확도가 떨어질 수 있습니다.")
+    elif brightness > BRIGHTNESS_WARN[1] or bright_ratio > CLIPPED_WARN:
+        issue("exposure", WARN, "사진이 밝은 편입니다. 감지 정확도가 떨어질 수 있습니다.")
+
+    return _finish(issues, metrics, started)
+
+
+def _finish(issues: List[Dict], metrics: Dict, started: float) -> Dict:
+    levels = {i["level"] for i in issues}
+    result = REJECT if REJECT in levels else WARN if WARN in levels else PASS
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    PREFLIGHT_CHECKS.inc(result=result)
+    if result == REJECT:
+        logger.info("품질 검사로 감지 호출을 막았습니다 (%s, %.1fms). 누적 절약 %d건",
+                    ", ".join(i["code"] for i in issues if i["level"] == REJECT), elapsed_ms, saved_detection_calls())
+    return {"result": result, "issues": issues, "metrics": metrics, "ms": elapsed_ms}
+
+
+def record_override() -> None:
+    """막힌 사진을 사용자가 그대로 감지하기로 한 경우."""
+    PREFLIGHT_OVERRIDES.inc()
+
+
+def saved_detection_calls() -> int:
+    return int(PREFLIGHT_CHECKS.value(result=REJECT) - PREFLIGHT_OVERRIDES.value())
@@ -1,5 +1,10 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageColor
 from io import BytesIO
+from functools import lru_cache
+import time
+import threading
+
+from metrics import RENDER_SECONDS
 
 # --------------------------------------------------------------------------
 # 시각화 헬퍼 함수
@@ -8,11 +13,13 @@ FONT_PATH = "LiberationSans-Regular.ttf"  # Colab 기본 폰트 경로, 로컬
 PROBLEM_COLOR = (255, 82, 82)
 IDEAL_COLOR = (0, 255, 255)
 IDEAL_TEXT_BG_COLOR = (0, 139, 139)
+FILL_ALPHA = 100
 
 def find_object(yolo_output, class_name):
     """YOLO 결과에서 특정 클래스의 첫 번째 객체를 반환 (없으면 None)"""
     return next((obj for obj in yolo_output if obj['class'] == class_name), None)
 
+@lru_cache(maxsize=16)
 def get_font(size=24):
     """기본 폰트를 로드하는 헬퍼 함수"""
     try:
@@ -20,6 +27,12 @@ def get_font(size=24):
     except IOError:
         return ImageFont.load_default()
 
+def to_hex(color):
+    """(R, G, B) 튜플을 '#rrggbb' 문자열로 변환합니다. 문자열 색상은 그대로 둡니다."""
+    if isinstance(color, str):
+        return color
+    return "#{:02x}{:02x}{:02x}".format(*color[:3])
+
 def draw_text_with_bg(draw, pos, text, font, text_color="white", bg_color=(0, 0, 0, 128), anchor="lt"):
     """텍스트 뒤에 반투명 배경을 그려 가독성을 높입니다."""
     bbox = draw.textbbox(pos, text, font=font, anchor=anchor)
@@ -27,58 +40,72 @@ def draw_text_with_bg(draw, pos, text, font, text_color="white", bg_color=(0, 0,
     draw.rectangle(padded_bbox, fill=bg_color)
     draw.text(pos, text, fill=text_color, font=font, anchor=anchor)
 
-def _draw_bounding_box(draw, obj, severity):
-    """문제 객체에 반투명 채움과 테두리가 있는 바운딩 박스를 그립니다."""
+# --------------------------------------------------------------------------
+# 오버레이 도형 생성 (이미지 좌표 기준의 박스/화살표/라벨 명세)
+# --------------------------------------------------------------------------
+def _rect(x1, y1, x2, y2, color, width):
+    return {"type": "rect", "xy": [x1, y1, x2, y2], "outline": to_hex(color), "width": width,
+            "fill": to_hex(color), "fill_alpha": FILL_ALPHA}
+
+def _label(pos, text, font_size, bg_color, anchor="lt", text_color="white"):
+    return {"type": "label", "pos": list(pos), "text": text, "font_size": font_size,
+            "text_color": text_color, "bg_color": to_hex(bg_color), "anchor": anchor}
+
+def _bounding_box_shapes(obj, severity):
+    """문제 객체에 반투명 채움과 테두리가 있는 바운딩 박스 도형을 만듭니다."""
     box = obj['box']
     x1, y1 = box['x'] - box['width'] / 2, box['y'] - box['height'] / 2
     x2, y2 = box['x'] + box['width'] / 2, box['y'] + box['height'] / 2
-    
-    color = PROBLEM_COLOR
-    fill_color = color + (100,)
 
-    draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=3, fill=fill_color)
-    draw_text_with_bg(draw, (x1 + 5, y1 + 5), obj['class'], get_font(20), bg_color=color)
+    color = PROBLEM_COLOR
+    return [
+        _rect(x1, y1, x2, y2, color, 3),
+        _label((x1 + 5, y1 + 5), obj['class'], 20, color),
+    ]
 
-def _draw_ideal_screen_box(draw, analyzer, report):
+def _ideal_screen_shapes(analyzer, report):
+    """(근거가 된 높이 문제, 도형 목록). 그릴 수 없으면 (None, [])."""
     height_problem = next((p for p in report if "HEIGHT" in p["problem_id"] and p['severity'] != 'Low'), None)
-    if not analyzer.main_screen or not height_problem or not analyzer.px_to_cm_ratio: return
+    if not analyzer.main_screen or not height_problem or not analyzer.px_to_cm_ratio: return None, []
 
     details = height_problem["details"]
     current_top_y = analyzer.main_screen['box']['y'] - analyzer.main_screen['box']['height'] / 2
     delta_cm = details['delta_cm']
     delta_px = delta_cm / analyzer.px_to_cm_ratio
     ideal_top_y = current_top_y - delta_px
-    
+
     ideal_width = analyzer.image_width_px * 0.45
     ideal_height = ideal_width * (9 / 16)
-    
+
     center_x = analyzer.image_width_px / 2
     ix1, iy1 = center_x - ideal_width / 2, ideal_top_y
     ix2, iy2 = center_x + ideal_width / 2, ideal_top_y + ideal_height
-    
-    draw.rectangle([(ix1, iy1), (ix2, iy2)], outline=IDEAL_COLOR, width=4, fill=IDEAL_COLOR + (100,))
+
     center_box_y = iy1 + (ideal_height / 2)
-    draw_text_with_bg(draw, (center_x, center_box_y), "Ideal Screen Position & Size", get_font(20), bg_color=IDEAL_TEXT_BG_COLOR, anchor="mm")
-    
-    if height_problem:
-        arrow_x = ix2 + 20
-        draw.line([(arrow_x, current_top_y), (arrow_x, ideal_top_y)], fill="yellow", width=5)
-        direction_text = "Move Up" if delta_cm > 0 else "Move Down"
-        text = f"{direction_text}: {abs(delta_cm)}cm"
-        draw_text_with_bg(draw, (arrow_x + 10, (current_top_y + ideal_top_y) / 2), text, get_font(22), bg_color="green")
-
-def _draw_ideal_kb_mouse_position(draw, analyzer, report):
+    shapes = [
+        _rect(ix1, iy1, ix2, iy2, IDEAL_COLOR, 4),
+        _label((center_x, center_box_y), "Ideal Screen Position & Size", 20, IDEAL_TEXT_BG_COLOR, anchor="mm"),
+    ]
+
+    arrow_x = ix2 + 20
+    direction_text = "Move Up" if delta_cm > 0 else "Move Down"
+    shapes.append({"type": "line", "xy": [arrow_x, current_top_y, arrow_x, ideal_top_y],
+                   "color": "yellow", "width": 5})
+    shapes.append(_label((arrow_x + 10, (current_top_y + ideal_top_y) / 2),
+                         f"{direction_text}: {abs(delta_cm)}cm", 22, "green"))
+    return height_problem, shapes
+
+def _ideal_kb_mouse_shapes(analyzer, report):
+    """(KEYBOARD_MOUSE_DISTANCE 문제, 도형 목록). 그릴 수 없으면 (None, [])."""
     ideal_center_x = analyzer.image_width_px / 2
     keyboard, mouse = find_object(analyzer.yolo_output, 'keyboard'), find_object(analyzer.yolo_output, 'mouse')
     distance_problem = next((p for p in report if p['problem_id'] == 'KEYBOARD_MOUSE_DISTANCE'), None)
-    if not all([keyboard, mouse, analyzer.px_to_cm_ratio, distance_problem]): return
-        
+    if not all([keyboard, mouse, analyzer.px_to_cm_ratio, distance_problem]): return None, []
+
     kb_y = keyboard['box']['y']
     kb_w, kb_h = keyboard['box']['width'], keyboard['box']['height']
     ikb_x1, ikb_y1 = ideal_center_x - kb_w / 2, kb_y - kb_h / 2
     ikb_x2, ikb_y2 = ideal_center_x + kb_w / 2, kb_y + kb_h / 2
-    draw.rectangle([(ikb_x1, ikb_y1), (ikb_x2, ikb_y2)], outline=IDEAL_COLOR, width=3, fill=IDEAL_COLOR + (100,))
-    draw_text_with_bg(draw, (ideal_center_x, kb_y), "Ideal Keyboard", get_font(20), bg_color=IDEAL_TEXT_BG_COLOR, anchor="mm")
 
     threshold_cm = distance_problem['details']['threshold_cm']
     threshold_px = threshold_cm / analyzer.px_to_cm_ratio
@@ -86,25 +113,30 @@ def _draw_ideal_kb_mouse_position(draw, analyzer, report):
     mouse_w, mouse_h = mouse['box']['width'], mouse['box']['height']
     im_x1, im_y1 = ideal_mouse_x - mouse_w / 2, kb_y - mouse_h / 2
     im_x2, im_y2 = ideal_mouse_x + mouse_w / 2, kb_y + mouse_h / 2
-    draw.rectangle([(im_x1, im_y1), (im_x2, im_y2)], outline=IDEAL_COLOR, width=3, fill=IDEAL_COLOR + (100,))
-    draw_text_with_bg(draw, (ideal_mouse_x, kb_y), "Ideal Mouse", get_font(20), bg_color=IDEAL_TEXT_BG_COLOR, anchor="mm")
 
-def draw_feedback_on_image(image_bytes, report, analyzer):
+    return distance_problem, [
+        _rect(ikb_x1, ikb_y1, ikb_x2, ikb_y2, IDEAL_COLOR, 3),
+        _label((ideal_center_x, kb_y), "Ideal Keyboard", 20, IDEAL_TEXT_BG_COLOR, anchor="mm"),
+        _rect(im_x1, im_y1, im_x2, im_y2, IDEAL_COLOR, 3),
+        _label((ideal_mouse_x, kb_y), "Ideal Mouse", 20, IDEAL_TEXT_BG_COLOR, anchor="mm"),
+    ]
+
+def build_feedback_overlay(report, analyzer, image_size):
     """
-    메인 함수: 원본 이미지, 분석 리포트, 분석기 인스턴스를 받아
-    피드백이 그려진 새 이미지를 반환합니다.
+    분석 리포트를 이미지 좌표 기준의 오버레이 명세(JSON 직렬화 가능)로 변환합니다.
+    클라이언트는 원본 사진 위에 이 명세를 겹쳐 그리고, 문제(problem_id)별로 켜고 끌 수 있습니다.
+    image_size는 오버레이를 겹칠 원본 이미지의 (폭, 높이)입니다. (분석기는 폭만 알고 있으므로 필수)
+
+    반환 형식:
+        {"width": W, "height": H,
+         "groups": [{"problem_id": ..., "severity": ..., "layer": "problem" | "ideal", "object": 클래스명(문제 레이어만),
+                     "shapes": [{"type": "rect" | "line" | "label", ...}, ...]}, ...]}
+    같은 객체가 여러 문제에 걸리면 문제마다 그룹이 하나씩 생기므로, 어느 문제를 끄더라도 나머지 문제의 박스는 남습니다.
     """
-    image = Image.open(BytesIO(image_bytes)).convert("RGBA")
-    
-    problems_to_draw = [p for p in report if p['severity'] != 'Low']
-    if not problems_to_draw:
-        return image.convert("RGB") # 그릴 문제가 없으면 원본 반환
+    width, height = image_size
+    groups = []
 
-    # 문제점 레이어
-    problem_overlay = Image.new("RGBA", image.size, (255, 255, 255, 0))
-    problem_draw = ImageDraw.Draw(problem_overlay)
-    
-    problematic_objects = {}
+    # 문제점 레이어: (문제, 객체)마다 그룹 하나
     for problem in report:
         if problem['severity'] == 'Low': continue
         problem_id = problem["problem_id"]
@@ -117,31 +149,266 @@ def draw_feedback_on_image(image_bytes, report, analyzer):
         elif "LIGHT_POSITION" in problem_id: involved_classes.append("desk lamp")
         for class_name in involved_classes:
             obj = find_object(analyzer.yolo_output, class_name)
-            if obj: problematic_objects[class_name] = (obj, problem['severity'])
+            if obj:
+                groups.append({"problem_id": problem_id, "severity": problem["severity"], "layer": "problem",
+                               "object": class_name, "shapes": _bounding_box_shapes(obj, problem['severity'])})
+
+    # 이상적인 위치 레이어: 도형 계산의 근거가 된 문제(화면 높이 / KEYBOARD_MOUSE_DISTANCE)에 귀속합니다.
+    for problem, shapes in (_ideal_screen_shapes(analyzer, report), _ideal_kb_mouse_shapes(analyzer, report)):
+        if shapes:
+            groups.append({"problem_id": problem["problem_id"], "severity": problem["severity"],
+                           "layer": "ideal", "shapes": shapes})
+
+    return {"width": width, "height": height, "groups": groups}
+
+def overlay_to_svg(overlay):
+    """오버레이 명세를 원본 이미지 위에 겹칠 수 있는 SVG 문자열로 변환합니다 (문제별 <g> 그룹)."""
+    from xml.sax.saxutils import escape
+
+    width, height = overlay["width"], overlay["height"]
+    if not width or not height:
+        raise ValueError(f"오버레이에 이미지 크기가 없습니다: {width}x{height} (build_feedback_overlay의 image_size 필요)")
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}">']
+    for group in overlay["groups"]:
+        data_object = ""
+        if group.get("object"):
+            data_object = ' data-object="%s"' % escape(group["object"], {'"': "&quot;"})
+        parts.append(f'<g class="{group["layer"]}" data-problem-id="{group["problem_id"]}" '
+                     f'data-severity="{group["severity"]}"{data_object}>')
+        for shape in group["shapes"]:
+            if shape["type"] == "rect":
+                x1, y1, x2, y2 = shape["xy"]
+                parts.append(f'<rect x="{x1:.1f}" y="{y1:.1f}" width="{x2 - x1:.1f}" height="{y2 - y1:.1f}" '
+                             f'fill="{shape["fill"]}" fill-opacity="{shape["fill_alpha"] / 255:.3f}" '
+                             f'stroke="{shape["outline"]}" stroke-width="{shape["width"]}"/>')
+            elif shape["type"] == "line":
+                x1, y1, x2, y2 = shape["xy"]
+                parts.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" '
+                             f'stroke="{shape["color"]}" stroke-width="{shape["width"]}"/>')
+            elif shape["type"] == "label":
+                x, y = shape["pos"]
+                size = shape["font_size"]
+                # 글자 폭은 클라이언트 폰트에 따라 다르므로 배경은 근사치로 그립니다.
+                text_w, text_h = len(shape["text"]) * size * 0.6, size
+                bx = x - text_w / 2 if shape["anchor"][0] == "m" else x
+                by = y - text_h / 2 if shape["anchor"][1] == "m" else y
+                parts.append(f'<rect x="{bx - 5:.1f}" y="{by - 2:.1f}" width="{text_w + 10:.1f}" '
+                             f'height="{text_h + 4:.1f}" fill="{shape["bg_color"]}"/>')
+                parts.append(f'<text x="{bx:.1f}" y="{by + text_h * 0.8:.1f}" font-size="{size}" '
+                             f'font-family="sans-serif" fill="{shape["text_color"]}">{escape(shape["text"])}</text>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return "".join(parts)
+
+# --------------------------------------------------------------------------
+# PIL 래스터화
+# --------------------------------------------------------------------------
+def _draw_shapes(draw, shapes):
+    """오버레이 도형 목록을 PIL ImageDraw 위에 그립니다."""
+    for shape in shapes:
+        if shape["type"] == "rect":
+            x1, y1, x2, y2 = shape["xy"]
+            fill = ImageColor.getrgb(shape["fill"])[:3] + (shape["fill_alpha"],)
+            draw.rectangle([(x1, y1), (x2, y2)], outline=shape["outline"], width=shape["width"], fill=fill)
+        elif shape["type"] == "line":
+            x1, y1, x2, y2 = shape["xy"]
+            draw.line([(x1, y1), (x2, y2)], fill=shape["color"], width=shape["width"])
+        elif shape["type"] == "label":
+            draw_text_with_bg(draw, tuple(shape["pos"]), shape["text"], get_font(shape["font_size"]),
+                              text_color=shape["text_color"], bg_color=shape["bg_color"], anchor=shape["anchor"])
+
+# --------------------------------------------------------------------------
+# NumPy 래스터화 (대량 렌더링용 백엔드)
+# --------------------------------------------------------------------------
+# 도형은 스레드별로 재사용하는 RGBA 레이어 버퍼에 슬라이스로 칠하고(텍스트/선만 주변을 잘라 PIL로),
+# 칠한 영역만 원본에 합성합니다. PIL 백엔드처럼 전체 프레임을 RGBA로 바꿔 두 번 합성하지 않습니다.
+# 좌표 처리(소수 버림)와 그리기 순서가 PIL 백엔드와 같아 결과 픽셀이 같습니다. (benchmark_render_backends의 differing_pixels)
+# 오버레이 렌더링만 잰 중앙값 (도형 16개, 소수 좌표, 40회):
+#   1000x1200  pil 29ms / numpy 15ms,  1920x1080  pil 51ms / numpy 32ms,  4032x3024  pil 246ms / numpy 116ms
+# 레이어 버퍼는 렌더링하는 스레드마다 본 가장 큰 이미지 크기로 하나씩 남습니다. (4032x3024면 약 49MB)
+_measure_draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+
+@lru_cache(maxsize=256)
+def _label_extent(text, font_size, anchor):
+    """(0, 0) 기준 라벨 텍스트의 bbox를 캐시합니다. 위치만 평행이동해서 재사용합니다."""
+    return _measure_draw.textbbox((0, 0), text, font=get_font(font_size), anchor=anchor)
+
+def _clip_box(arr, x1, y1, x2, y2):
+    """양 끝을 포함하는 정수 좌표 박스를 arr 범위의 슬라이스 경계로 자릅니다. 소수 좌표는 PIL처럼 버립니다. (int())"""
+    h, w = arr.shape[:2]
+    x1, x2 = sorted((int(x1), int(x2)))
+    y1, y2 = sorted((int(y1), int(y2)))
+    return max(x1, 0), max(y1, 0), min(x2 + 1, w), min(y2 + 1, h)
+
+def _paint_np(layer, box, color, alpha=255):
+    """
+    RGBA 레이어 버퍼의 box 영역을 (color, alpha)로 덮어쓰고 칠한 영역을 반환합니다 (없으면 None).
+    PIL ImageDraw가 투명 오버레이에 그릴 때처럼 레이어 안에서는 섞지 않고 나중 도형이 덮어씁니다.
+    """
+    x1, y1, x2, y2 = _clip_box(layer, *box)
+    if x1 >= x2 or y1 >= y2: return None
+    layer[y1:y2, x1:x2, :3] = color
+    layer[y1:y2, x1:x2, 3] = alpha
+    return x1, y1, x2, y2
 
-    for class_name, (obj, severity) in problematic_objects.items():
-        _draw_bounding_box(problem_draw, obj, severity)
+def _draw_pil_np(layer, shape, box):
+    """
+    텍스트/선을 레이어 버퍼의 box 영역만 잘라낸 작은 RGBA 이미지에 PIL로 그린 뒤 되돌려 씁니다. (전체 프레임 복사 없음)
+    안티앨리어싱 가장자리가 빈 픽셀과 섞일 때 PIL 백엔드와 같도록 빈 픽셀은 (255, 255, 255, 0)으로 둡니다.
+    """
+    x1, y1, x2, y2 = _clip_box(layer, *box)
+    if x1 >= x2 or y1 >= y2: return None
+    region = layer[y1:y2, x1:x2]
+    region[region[..., 3] == 0] = (255, 255, 255, 0)
+    crop = Image.fromarray(region, "RGBA")
+    draw = ImageDraw.Draw(crop)
+    if shape["type"] == "label":
+        x, y = shape["pos"]
+        draw.text((x - x1, y - y1), shape["text"], fill=shape["text_color"],
+                  font=get_font(shape["font_size"]), anchor=shape["anchor"])
+    else:
+        lx1, ly1, lx2, ly2 = shape["xy"]
+        draw.line([(lx1 - x1, ly1 - y1), (lx2 - x1, ly2 - y1)], fill=shape["color"], width=shape["width"])
+    region[...] = crop
+    return x1, y1, x2, y2
+
+def _draw_shapes_np(layer, shapes):
+    """
+    도형을 순서대로 레이어 버퍼에 그리고 칠한 영역 목록을 반환합니다.
+    사각형과 라벨 배경은 슬라이스로 칠하고, 텍스트와 선만 그 주변을 잘라 PIL로 그립니다.
+    """
+    boxes = []
+    for shape in shapes:
+        if shape["type"] == "rect":
+            # PIL은 사각형 좌표를 먼저 정수로 버린 뒤 테두리 두께를 안쪽으로 셉니다.
+            x1, y1, x2, y2 = (int(v) for v in shape["xy"])
+            w = shape["width"]
+            boxes.append(_paint_np(layer, (x1, y1, x2, y2), ImageColor.getrgb(shape["fill"])[:3], shape["fill_alpha"]))
+            outline = ImageColor.getrgb(shape["outline"])[:3]
+            for edge in ((x1, y1, x2, y1 + w - 1), (x1, y2 - w + 1, x2, y2),
+                         (x1, y1, x1 + w - 1, y2), (x2 - w + 1, y1, x2, y2)):
+                _paint_np(layer, edge, outline)
+        elif shape["type"] == "line":
+            x1, y1, x2, y2 = shape["xy"]
+            pad = shape["width"]
+            boxes.append(_draw_pil_np(layer, shape, (min(x1, x2) - pad, min(y1, y2) - pad,
+                                                     max(x1, x2) + pad, max(y1, y2) + pad)))
+        elif shape["type"] == "label":
+            x, y = shape["pos"]
+            bx1, by1, bx2, by2 = _label_extent(shape["text"], shape["font_size"], shape["anchor"])
+            boxes.append(_paint_np(layer, (x + bx1 - 5, y + by1 - 2, x + bx2 + 5, y + by2 + 2),
+                                   ImageColor.getrgb(shape["bg_color"])[:3]))
+            _draw_pil_np(layer, shape, (x + bx1 - 1, y + by1 - 1, x + bx2 + 1, y + by2 + 1))
+    return [box for box in boxes if box]
+
+def _composite_np(image, layer, boxes):
+    """
+    레이어 버퍼를 RGB 이미지 위에 alpha 합성합니다. 칠한 영역(boxes)만 잘라 PIL alpha_composite로 합성해 되붙이고
+    (같은 영역을 NumPy uint16 연산으로 섞는 것보다 빠름), 겹친 영역이 두 번 합성되지 않도록 합성한 영역의 alpha는 0으로 지웁니다.
+    """
+    for x1, y1, x2, y2 in boxes:
+        src = layer[y1:y2, x1:x2]
+        base = image.crop((x1, y1, x2, y2)).convert("RGBA")
+        image.paste(Image.alpha_composite(base, Image.fromarray(src, "RGBA")).convert("RGB"), (x1, y1))
+        src[..., 3] = 0
+
+_layer_buffers = threading.local()
 
-    # 이상적인 위치 레이어
+def _layer_buffer(height, width):
+    """
+    이 스레드가 이미지마다 재사용하는 RGBA 레이어 버퍼 (height x width 뷰).
+    합성이 끝난 영역은 alpha가 0으로 돌아가므로 렌더링이 끝나면 다시 투명한 상태입니다.
+    """
+    # NOTE: numpy는 이 백엔드에서만 쓰므로 기본(PIL) 렌더링 경로가 numpy에 의존하지 않도록 여기서 불러옵니다.
+    import numpy as np
+
+    buffer = getattr(_layer_buffers, "buffer", None)
+    if buffer is None or buffer.shape[0] < height or buffer.shape[1] < width:
+        shape = (height, width) if buffer is None else (max(height, buffer.shape[0]), max(width, buffer.shape[1]))
+        buffer = _layer_buffers.buffer = np.zeros(shape + (4,), dtype=np.uint8)
+    return buffer[:height, :width]
+
+def _render_overlay_numpy(image, overlay):
+    """
+    _render_overlay_pil과 같은 순서로 그립니다: 문제점 / 이상적인 위치 레이어를 각각 투명 버퍼에 도형 순서대로 그린 뒤
+    원본 위에 차례로 alpha 합성합니다. 합성은 칠한 영역 안에서만 하므로 전체 프레임 RGBA 변환과 합성 두 번이 없습니다.
+    """
+    image = image.copy() if image.mode == "RGB" else image.convert("RGB")
+    layer = _layer_buffer(image.height, image.width)
+    try:
+        for layer_name in ("problem", "ideal"):
+            # 합성이 끝난 영역은 alpha가 0으로 돌아가므로 두 레이어가 같은 버퍼를 씁니다.
+            boxes = []
+            for group in overlay["groups"]:
+                if group["layer"] == layer_name:
+                    boxes.extend(_draw_shapes_np(layer, group["shapes"]))
+            _composite_np(image, layer, boxes)
+    except Exception:
+        # 칠하다 만 영역이 다음 이미지에 섞이지 않도록 버퍼를 버립니다.
+        _layer_buffers.buffer = None
+        raise
+    return image
+
+def _render_overlay_pil(image, overlay):
+    """문제점 / 이상적인 위치 레이어를 각각 그린 뒤 alpha_composite로 합성합니다."""
+    image = image.convert("RGBA")
+    problem_overlay = Image.new("RGBA", image.size, (255, 255, 255, 0))
     ideal_overlay = Image.new("RGBA", image.size, (255, 255, 255, 0))
-    ideal_draw = ImageDraw.Draw(ideal_overlay)
-    
-    drawn_kb_mouse_ideal, drawn_screen_ideal = False, False
-    for problem in report:
-        if problem['severity'] == 'Low': continue
-        problem_id = problem["problem_id"]
-        
-        if problem_id in ["SCREEN_HEIGHT", "LAPTOP_HEIGHT", "VIEWING_DISTANCE"]:
-            if not drawn_screen_ideal:
-                _draw_ideal_screen_box(ideal_draw, analyzer, report)
-                drawn_screen_ideal = True
-        elif problem_id in ["KEYBOARD_MOUSE_DISTANCE", "KEYBOARD_MOUSE_ALIGNMENT"]:
-            if not drawn_kb_mouse_ideal:
-                _draw_ideal_kb_mouse_position(ideal_draw, analyzer, report)
-                drawn_kb_mouse_ideal = True
-    
+    draws = {"problem": ImageDraw.Draw(problem_overlay), "ideal": ImageDraw.Draw(ideal_overlay)}
+    for group in overlay["groups"]:
+        _draw_shapes(draws[group["layer"]], group["shapes"])
+
     # 이미지 합성
     image_with_problems = Image.alpha_composite(image, problem_overlay)
     final_image = Image.alpha_composite(image_with_problems, ideal_overlay)
-    
     return final_image.convert("RGB")
+
+RENDER_BACKENDS = {"pil": _render_overlay_pil, "numpy": _render_overlay_numpy}
+
+def draw_feedback_on_image(image_bytes, report, analyzer, backend="pil"):
+    """
+    메인 함수: 원본 이미지, 분석 리포트, 분석기 인스턴스를 받아
+    피드백이 그려진 새 이미지를 반환합니다.
+    backend="numpy"는 레이어를 NumPy 버퍼에 칠하고 칠한 영역만 합성하는 대량 렌더링용 백엔드입니다.
+    (결과 픽셀은 PIL 백엔드와 같고 더 빠름, 위 측정 참고)
+    """
+    if backend not in RENDER_BACKENDS:
+        raise ValueError(f"지원하지 않는 렌더링 백엔드입니다: {backend} (사용 가능: {list(RENDER_BACKENDS)})")
+
+    start = time.perf_counter()
+    image = Image.open(BytesIO(image_bytes))
+
+    problems_to_draw = [p for p in report if p['severity'] != 'Low']
+    if not problems_to_draw:
+        result = image.convert("RGB") # 그릴 문제가 없으면 원본 반환
+    else:
+        overlay = build_feedback_overlay(report, analyzer, image.size)
+        result = RENDER_BACKENDS[backend](image, overlay)
+    RENDER_SECONDS.observe(time.perf_counter() - start, backend=backend)
+    return result
+
+def _differing_pixels(a, b):
+    """두 RGB 이미지에서 한 채널이라도 값이 다른 픽셀 수."""
+    r, g, bl = ImageChops.difference(a, b).split()
+    mask = ImageChops.lighter(ImageChops.lighter(r, g), bl)
+    return sum(mask.histogram()[1:])
+
+def benchmark_render_backends(image_bytes, report, analyzer, repeat=20):
+    """
+    각 렌더링 백엔드로 repeat번 렌더링해 1회당 평균/최소 소요 시간(ms)을 비교합니다.
+    differing_pixels는 PIL 백엔드 결과와 픽셀 값이 다른 픽셀 수입니다. (0이어야 함)
+    """
+    results = {}
+    reference = draw_feedback_on_image(image_bytes, report, analyzer, backend="pil")
+    for backend in RENDER_BACKENDS:
+        # 폰트/라벨 캐시 워밍업을 겸합니다.
+        differing = _differing_pixels(reference, draw_feedback_on_image(image_bytes, report, analyzer, backend=backend))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            draw_feedback_on_image(image_bytes, report, analyzer, backend=backend)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[backend] = {"mean_ms": round(sum(timings) / len(timings), 2), "min_ms": round(min(timings), 2),
+                            "differing_pixels": differing}
+    return results
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Streamlit 재실행에도 살아남는 백그라운드 작업 실행기
+
+Streamlit은 버튼 클릭이나 페이지 이동이 일어나면 실행 중인 스크립트를 중단하고 처음부터 다시 실행합니다.
+분석을 스크립트 안에서 직접 돌리면 그때마다 작업이 버려지고 다음 방문에서 처음부터 다시 하게 됩니다.
+
+- 작업은 프로세스 공용의 제한된 워커 풀에서 실행되고, 세션에는 작업 id만 저장합니다.
+- 작업 id는 입력으로부터 만든 키이므로 같은 입력으로 다시 제출하면 진행 중이거나 끝난 작업을 그대로 돌려줍니다.
+  실패한 작업도 마찬가지이며, submit(..., retry=True)일 때만 새로 실행합니다.
+- 작업 함수는 job.update(stage=..., 부분결과=...)로 진행 단계와 부분 결과를 알릴 수 있고,
+  페이지는 get()으로 상태를 확인하며 자동 새로고침합니다.
+- 끝난 작업은 TTL이 지나면 정리됩니다. 대기 작업이 max_pending을 넘으면 QueueFullError.
+
+환경변수로 설정할 수 있습니다.
+    JOB_WORKERS      (기본: 4)
+    JOB_MAX_PENDING  (기본: 32)
+    JOB_TTL_SEC      (기본: 1시간)
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from rate_limiter import QueueFullError
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job:
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.partial: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """작업이 끝날 때까지 최대 timeout초 기다립니다. 끝났으면 True."""
+        return self._done.wait(timeout)
+
+    def update(self, stage: Optional[str] = None, **partial) -> None:
+        """작업 함수가 진행 단계와 부분 결과를 알립니다. (페이지가 폴링으로 읽음)"""
+        if stage is not None:
+            self.stage = stage
+        self.partial.update(partial)
+
+
+class JobRunner:
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, ttl_sec: float = 3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.max_pending = max_pending
+        self.ttl_sec = ttl_sec
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, fn: Callable[..., Any], *args, retry: bool = False, **kwargs) -> Job:
+        """
+        fn(job, *args, **kwargs)를 백그라운드에서 실행합니다. 같은 id의 작업이 있으면 그것을 반환합니다.
+        실패한 작업도 그대로 반환하므로(폴링마다 다시 제출되지 않도록) 다시 실행하려면 retry=True로 제출합니다.
+        """
+        with self._lock:
+            self._cleanup()
+            job = self._jobs.get(job_id)
+            reused = job is not None and not (retry and job.status == FAILED)
+            record_cache_lookup("analysis_job", reused)
+            if reused:
+                return job
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"분석 작업 대기열이 가득 찼습니다 ({self.max_pending}건).")
+            job = Job(job_id)
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.status = RUNNING
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = DONE
+        except BaseException as e:
+            logger.exception("백그라운드 작업 실패: %s", job.id[:12])
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+
+    def _cleanup(self) -> None:
+        """끝난 지 TTL이 지난 작업을 지웁니다. (락은 호출자가 잡음)"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl_sec]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """프로세스 공용 작업 실행기."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(
+                max_workers=int(os.environ.get("JOB_WORKERS", 4)),
+                max_pending=int(os.environ.get("JOB_MAX_PENDING", 32)),
+                ttl_sec=float(os.environ.get("JOB_TTL_SEC", 3600)),
+            )
+        return _runner
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+동시 세션 부하 테스트 (final_app 1→5단계)
+
+Streamlit 테스트 API(AppTest)로 N개의 가상 세션을 동시에 띄워 1→5단계를 반복하고,
+처리량, 단계별 지연 백분위, 메모리 증가, 오류율을 보고합니다. 감지/GPT는 기본적으로
+부하 생성기 프로세스에서 띄운 대역 서버(stand_in_servers)를 바라보므로 외부 비용이 들지 않습니다.
+
+    python load_test.py --sessions 20 --iterations 3 --think-time 1.0 --latency-ms 800
+    python load_test.py --sessions 50 --ramp-up 10 --json result.json
+
+- 앱은 pages/metadata.json이 있는 배포 디렉토리(--cwd, 기본: 앱 파일 위치)에서 실행됩니다.
+- AppTest는 파일 업로드를 흉내 낼 수 없으므로 2단계 업로드는 앱과 같은 감지 경로(detection.detect_workflow)를
+  직접 호출한 뒤 그 결과를 세션 상태에 넣는 것으로 대신합니다. 3단계 사용자 정보도 세션 상태로 넣습니다.
+- AppTest는 스레드 안전하지 않아 한 프로세스에서 여러 세션을 동시에 돌리면 세션 상태가 섞입니다.
+  그래서 세션마다 별도 프로세스(spawn)에서 실행하고, 단계별 측정값과 오류를 부모 프로세스에서 합칩니다.
+  캐시/블롭/기록 저장소와 대역 서버는 모든 세션이 함께 쓰지만, 작업 실행기와 공정 대기열 같은 프로세스 안의 자원은
+  세션마다 따로입니다. (워커 프로세스를 여럿 띄운 배포에 가까움) 메모리는 세션 프로세스별 RSS입니다.
+- 캐시/블롭/기록 저장소는 기본적으로 임시 디렉토리를 씁니다(--keep-caches로 끔). 세션마다 다른 모니터 크기를
+  넣어 리포트가 달라지게 하므로 조언 캐시가 결과를 왜곡하지 않습니다(--same-inputs로 끔).
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PAGE_STAGES = ("page1", "page2", "detect", "page3", "page4_to_5")
+MONITOR_SIZES = (21.5, 23.8, 24.0, 27.0, 31.5, 32.0, 34.0)
+RSS_SAMPLE_INTERVAL_SEC = 0.5
+
+
+# --------------------------------------------------------------------------
+# 1. 준비
+# --------------------------------------------------------------------------
+def blank_png(width: int = 1000, height: int = 1200) -> bytes:
+    """단색 PNG. 대역 서버는 헤더의 크기만 읽습니다."""
+    row = b"\x00" + b"\xd0\xd0\xd0" * width
+    raw = zlib.compress(row * height, 9)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+
+def current_rss_mb() -> float:
+    """현재 프로세스 RSS(MB). /proc가 없으면 최대 RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 1024
+
+
+def start_stand_ins(args) -> str:
+    """대역 서버를 백그라운드 스레드로 띄우고 주소를 반환합니다."""
+    from stand_in_servers import StandInConfig, make_server
+
+    config = StandInConfig(args.latency_ms, args.jitter, args.error_rate, args.tokens_per_sec, args.seed)
+    server = make_server("127.0.0.1", args.stand_in_port, config)
+    threading.Thread(target=server.serve_forever, name="stand-in", daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def configure_environment(args) -> None:
+    """앱 모듈을 import 하기 전에 백엔드 주소와 저장소 경로를 환경변수로 정합니다."""
+    if not args.external:
+        base_url = start_stand_ins(args)
+        os.environ.update({"ROBOFLOW_API_URL": base_url, "ROBOFLOW_API_KEY": "stand-in",
+                           "OPENAI_BASE_URL": f"{base_url}/v1", "OPENAI_API_KEY": "stand-in"})
+        logger.info("대역 서버: %s", base_url)
+    if not args.keep_caches:
+        root = tempfile.mkdtemp(prefix="load-test-")
+        os.environ.update({"BLOB_STORE_DIR": os.path.join(root, "blobs"),
+                           "SHARED_CACHE_URL": "sqlite:///" + os.path.join(root, "shared_cache.sqlite3"),
+                           "ADVICE_CACHE_PATH": os.path.join(root, "advice_cache.sqlite3"),
+                           "ANALYSIS_HISTORY_PATH": os.path.join(root, "analysis_history.sqlite3")})
+    # 세션 수 × 단계 수만큼 나오는 span 로그는 끄고 집계만 씁니다.
+    logging.getLogger("latency").setLevel(logging.WARNING)
+
+
+# --------------------------------------------------------------------------
+# 2. 가상 세션
+# --------------------------------------------------------------------------
+class SessionFailed(Exception):
+    pass
+
+
+def _check(at, stage: str, expected_page: Optional[int] = None) -> None:
+    problems = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+    if problems:
+        raise SessionFailed(f"{stage}: {problems[0][:200]}")
+    if expected_page is not None and at.session_state["current_page"] != expected_page:
+        raise SessionFailed(f"{stage}: {expected_page}단계가 아닌 {at.session_state['current_page']}단계에 있습니다.")
+
+
+def run_flow(session_no: int, iteration: int, args, image_bytes: bytes) -> None:
+    """한 세션의 1→5단계 한 바퀴. 단계 소요 시간은 loadtest.<단계> span으로 기록합니다."""
+    from streamlit.testing.v1 import AppTest
+    from tracing import span
+    from detection import detect_workflow, find_screens
+
+    rng = random.Random(args.seed * 10007 + session_no * 101 + iteration)
+
+    def think():
+        if args.think_time > 0:
+            time.sleep(rng.expovariate(1 / args.think_time))
+
+    at = AppTest.from_file(args.app, default_timeout=args.page_timeout)
+    at.secrets["ROBOFLOW_API_KEY"] = os.environ.get("ROBOFLOW_API_KEY", "stand-in")
+
+    with span("loadtest.page1"):
+        at.run()
+    _check(at, "page1", 1)
+
+    think()
+    with span("loadtest.page2"):
+        at.button(key="start_p1").click().run()
+    _check(at, "page2", 2)
+
+    # 2단계 업로드 대신 같은 감지 경로를 직접 호출합니다.
+    with span("loadtest.detect"):
+        workflow_result = detect_workflow(image_bytes, suffix=".png", session_id=f"load-{session_no}")
+        screens = find_screens(workflow_result)
+    if not screens:
+        raise SessionFailed("detect: 스크린이 감지되지 않았습니다.")
+    at.session_state["workflow_result"] = [workflow_result]
+    at.session_state["main_screen"] = screens[0]
+    at.session_state["monitor_inch"] = 27.0 if args.same_inputs else rng.choice(MONITOR_SIZES)
+    at.session_state["user_inputs"] = {
+        "user_height_cm": 170 if args.same_inputs else rng.randint(150, 190),
+        "gender": "male" if args.same_inputs else rng.choice(("male", "female")),
+        "handedness": "오른손잡이",
+    }
+
+    think()
+    with span("loadtest.page3"):
+        at.button(key="next_p3").click().run()
+    _check(at, "page3", 3)
+
+    think()
+    deadline = time.monotonic() + args.page_timeout
+    with span("loadtest.page4_to_5"):
+        at.button(key="next_p4").click().run()
+        # 4단계는 작업이 끝날 때까지 스스로 재실행합니다. AppTest가 재실행 도중 돌아오면 이어서 실행합니다.
+        while at.session_state["current_page"] == 4 and not at.exception and time.monotonic() < deadline:
+            at.run()
+    _check(at, "page4_to_5", 5)
+
+
+def session_worker(session_no: int, args, image_bytes: bytes, outcomes: Counter, errors: Counter) -> None:
+    from tracing import record_span
+
+    time.sleep(args.ramp_up * session_no / max(args.sessions, 1))
+    for iteration in range(args.iterations):
+        started = time.perf_counter()
+        try:
+            run_flow(session_no, iteration, args, image_bytes)
+        except Exception as e:
+            ok = False
+            message = str(e) if isinstance(e, SessionFailed) else f"{type(e).__name__}: {e}"
+            logger.warning("세션 %d 실패: %s", session_no, message)
+            errors[message.split(":", 1)[0] if isinstance(e, SessionFailed) else type(e).__name__] += 1
+        else:
+            ok = True
+        record_span("loadtest.flow", (time.perf_counter() - started) * 1000, ok=ok)
+        outcomes["ok" if ok else "failed"] += 1
+
+
+# --------------------------------------------------------------------------
+# 3. 실행과 보고
+# --------------------------------------------------------------------------
+def sample_rss(samples: List[float], stop: threading.Event) -> None:
+    while not stop.wait(RSS_SAMPLE_INTERVAL_SEC):
+        samples.append(current_rss_mb())
+
+
+def session_process(session_no: int, args, image_bytes: bytes) -> Dict:
+    """
+    세션 프로세스 하나의 본체. 환경변수, 작업 디렉토리, sys.path는 부모에서 물려받습니다. (spawn)
+    {"outcomes", "errors", "samples"(tracing.stage_samples), "rss_mb", "started", "finished"}를 반환합니다.
+    """
+    from tracing import stage_samples
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("latency").setLevel(logging.WARNING)
+    outcomes, errors = Counter(), Counter()
+    rss_samples = [current_rss_mb()]
+    stop = threading.Event()
+    threading.Thread(target=sample_rss, args=(rss_samples, stop), daemon=True).start()
+
+    started = time.time()
+    session_worker(session_no, args, image_bytes, outcomes, errors)
+    finished = time.time()
+    stop.set()
+    rss_samples.append(current_rss_mb())
+    return {"outcomes": dict(outcomes), "errors": dict(errors), "samples": stage_samples(),
+            "rss_mb": rss_samples, "started": started, "finished": finished}
+
+
+def run_load_test(args) -> Dict:
+    from tracing import merge_samples, stage_summary
+
+    image_bytes = open(args.image, "rb").read() if args.image else blank_png()
+    outcomes, errors = Counter(), Counter()
+    results = []
+
+    started = time.time()
+    # 프로세스가 끝까지 세션 하나만 돌도록 세션 수만큼 워커를 둡니다.
+    with ProcessPoolExecutor(max_workers=args.sessions, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(session_process, session_no, args, image_bytes) for session_no in range(args.sessions)]
+        for session_no, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.warning("세션 프로세스 %d 실패: %s: %s", session_no, type(e).__name__, e)
+                outcomes["failed"] += args.iterations
+                errors[f"process.{type(e).__name__}"] += args.iterations
+
+    for result in results:
+        outcomes.update(result["outcomes"])
+        errors.update(result["errors"])
+        merge_samples(result["samples"])
+    # 처리량은 프로세스 시작(import) 시간을 빼고 첫 세션 시작부터 마지막 세션 종료까지로 계산합니다.
+    elapsed = (max(r["finished"] for r in results) - min(r["started"] for r in results)) if results \
+        else time.time() - started
+
+    total = outcomes["ok"] + outcomes["failed"]
+    summary = stage_summary()
+    rss = [r["rss_mb"] for r in results] or [[0.0]]
+    return {
+        "sessions": args.sessions,
+        "iterations": args.iterations,
+        "elapsed_sec": round(elapsed, 1),
+        "flows": total,
+        "throughput_flows_per_min": round(outcomes["ok"] / elapsed * 60, 2) if elapsed else 0.0,
+        "error_rate": round(outcomes["failed"] / total, 4) if total else 0.0,
+        "errors": dict(errors),
+        "pages": {stage: summary.get(f"loadtest.{stage}") for stage in PAGE_STAGES + ("flow",)},
+        "app_stages": {stage: s for stage, s in summary.items() if not stage.startswith("loadtest.")},
+        # 세션 프로세스별 RSS: 시작/끝/증가는 평균, 최대는 가장 큰 프로세스 값
+        "rss_mb": {"start": round(sum(r[0] for r in rss) / len(rss), 1),
+                   "end": round(sum(r[-1] for r in rss) / len(rss), 1),
+                   "peak": round(max(max(r) for r in rss), 1),
+                   "growth": round(sum(r[-1] - r[0] for r in rss) / len(rss), 1)},
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"\n세션 {report['sessions']}개 × {report['iterations']}회, {report['elapsed_sec']}초")
+    print(f"완료 흐름 {report['flows']}개, 처리량 {report['throughput_flows_per_min']}회/분, "
+          f"오류율 {report['error_rate'] * 100:.1f}%")
+    for reason, count in report["errors"].items():
+        print(f"  - {reason}: {count}")
+    print(f"\n{'단계':<14}{'건수':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'최대':>10}  (ms)")
+    for stage, s in report["pages"].items():
+        if s:
+            print(f"{stage:<14}{s['count']:>6}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+    rss = report["rss_mb"]
+    print(f"\n세션 프로세스 RSS: 시작 {rss['start']}MB → 끝 {rss['end']}MB (최대 {rss['peak']}MB, 증가 {rss['growth']}MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="final_app 동시 세션 부하 테스트")
+    parser.add_argument("--app", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "final_app.py"))
+    parser.add_argument("--cwd", help="앱을 실행할 디렉토리 (pages/가 있는 곳, 기본: 앱 파일 위치)")
+    parser.add_argument("--sessions", type=int, default=10, help="동시 세션 수")
+    parser.add_argument("--iterations", type=int, default=1, help="세션당 1→5단계 반복 횟수")
+    parser.add_argument("--think-time", type=float, default=1.0, help="단계 사이 평균 대기(초, 지수분포)")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="모든 세션이 시작되기까지 걸리는 시간(초)")
+    parser.add_argument("--page-timeout", type=float, default=60.0, help="단계 하나의 최대 시간(초)")
+    parser.add_argument("--image", help="감지에 보낼 이미지 (기본: 1000x1200 단색 PNG)")
+    parser.add_argument("--external", action="store_true", help="대역 서버를 띄우지 않고 환경변수의 백엔드를 사용")
+    parser.add_argument("--stand-in-port", type=int, default=0, help="대역 서버 포트 (0이면 빈 포트)")
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-caches", action="store_true", help="설정된 캐시/블롭/기록 경로를 그대로 사용")
+    parser.add_argument("--same-inputs", action="store_true", help="모든 세션이 같은 입력을 사용 (캐시 적중 측정용)")
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    args.app = os.path.abspath(args.app)
+    args.image = args.image and os.path.abspath(args.image)
+    args.json = args.json and os.path.abspath(args.json)
+    os.chdir(args.cwd or os.path.dirname(args.app))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    configure_environment(args)
+
+    report = run_load_test(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report["error_rate"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
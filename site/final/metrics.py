@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 텍스트 형식 지표 (용량 계획용)
+
+로그(tracing)만으로는 처리량이나 캐시 적중률을 시간에 따라 보기 어려워, 핫패스에서 카운터/히스토그램을 갱신하고
+로컬 포트에서 Prometheus가 긁어갈 수 있게 내보냅니다. 외부 라이브러리 없이 표준 라이브러리만 씁니다.
+
+- 갱신은 락 하나와 dict 덧셈뿐이라 요청 경로에 부담이 거의 없습니다.
+- tracing.span/record_span으로 재는 모든 단계는 stage_duration_seconds{stage=...}에도 들어갑니다.
+  (감지 요청 detection.request, GPT advice.gpt, 렌더링 render.feedback, 페이지 이동 page.transition 등)
+- 프로세스마다 따로 집계되므로 Streamlit 워커를 여럿 띄우면 포트를 나눠 주고 Prometheus에서 합칩니다.
+
+환경변수로 설정할 수 있습니다.
+    METRICS_PORT  (설정하면 final_app이 이 포트로 /metrics를 엽니다. 기본: 끔)
+    METRICS_HOST  (기본: 127.0.0.1)
+    SESSION_IDLE_SEC (기본: 300, 이 시간 동안 재실행이 없는 세션은 활성 세션에서 뺍니다)
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DEFAULT_BYTES_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6)
+DEFAULT_SESSION_IDLE_SEC = 300
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# --------------------------------------------------------------------------
+# 1. 지표 종류
+# --------------------------------------------------------------------------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(_Metric):
+    """set()으로 값을 두거나, set_function()으로 내보낼 때마다 값을 계산합니다."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        self._function = fn
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [버킷별 개수..., 합계, 개수]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._values.items()]
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += entry[i]
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    """등록된 모든 지표를 Prometheus 텍스트 형식으로 만듭니다."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# --------------------------------------------------------------------------
+# 2. 앱 지표
+# --------------------------------------------------------------------------
+STAGE_DURATION = Histogram("stage_duration_seconds", "tracing span으로 잰 단계별 소요 시간", ["stage", "ok"])
+DETECTION_REQUESTS = Counter("detection_requests_total", "Roboflow 워크플로우 호출 수", ["outcome"])
+CACHE_REQUESTS = Counter("cache_requests_total", "캐시 조회 수", ["cache", "result"])
+GPT_TOKENS = Counter("gpt_tokens_total", "GPT 토큰 사용량 (kind=prompt/completion은 API 보고값, prompt_estimated는 usage가 없을 때의 로컬 추정)", ["label", "kind"])
+ANALYZER_RULE_RUNS = Counter("analyzer_rule_runs_total", "분석 규칙 실행 수", ["rule", "outcome"])
+RENDER_SECONDS = Histogram("render_seconds", "피드백 이미지 그리기 시간", ["backend"])
+RENDER_BYTES = Histogram("render_output_bytes", "인코딩된 피드백 이미지 크기", buckets=DEFAULT_BYTES_BUCKETS)
+PREFLIGHT_CHECKS = Counter("preflight_checks_total", "감지 전 로컬 사진 품질 검사 수", ["result"])
+PREFLIGHT_OVERRIDES = Counter("preflight_overrides_total", "품질 검사에서 막힌 사진을 사용자가 그대로 감지한 수")
+ACTIVE_SESSIONS = Gauge("active_sessions", "최근 SESSION_IDLE_SEC 안에 재실행된 Streamlit 세션 수")
+SESSION_STATE_BYTES = Gauge("session_state_bytes", "활성 세션 session_state 크기 추정치 합계")
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# --------------------------------------------------------------------------
+# 3. 세션 추적
+# --------------------------------------------------------------------------
+def estimate_size(obj, _depth: int = 0) -> int:
+    """dict/list/문자열/바이트로 이루어진 값의 대략적인 메모리 크기 (바이트). 깊이 6까지만 따라갑니다."""
+    size = sys.getsizeof(obj, 0)
+    if _depth >= 6:
+        return size
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, _depth + 1) for v in obj)
+    return size
+
+
+class SessionTracker:
+    """세션 id별 마지막 재실행 시각과 session_state 크기 추정치. 유휴 세션은 집계에서 빠집니다."""
+
+    def __init__(self, idle_sec: float = DEFAULT_SESSION_IDLE_SEC):
+        self.idle_sec = idle_sec
+        self._sessions: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id: str, state_bytes: int) -> None:
+        with self._lock:
+            self._sessions[session_id] = (time.time(), state_bytes)
+
+    def _active(self) -> List[Tuple[float, int]]:
+        cutoff = time.time() - self.idle_sec
+        with self._lock:
+            for session_id in [s for s, (seen, _) in self._sessions.items() if seen < cutoff]:
+                del self._sessions[session_id]
+            return list(self._sessions.values())
+
+    def active_count(self) -> int:
+        return len(self._active())
+
+    def total_state_bytes(self) -> int:
+        return sum(state_bytes for _, state_bytes in self._active())
+
+
+sessions = SessionTracker(float(os.environ.get("SESSION_IDLE_SEC", DEFAULT_SESSION_IDLE_SEC)))
+ACTIVE_SESSIONS.set_function(sessions.active_count)
+SESSION_STATE_BYTES.set_function(sessions.total_state_bytes)
+
+
+# --------------------------------------------------------------------------
+# 4. /metrics HTTP 서버
+# --------------------------------------------------------------------------
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    /metrics 서버를 백그라운드 스레드로 한 번만 엽니다. 포트가 없으면(METRICS_PORT 미설정) None.
+    포트를 이미 다른 프로세스가 쓰고 있으면 경고만 남기고 None을 반환합니다.
+    """
+    global _server, _server_failed
+    port = port or int(os.environ.get("METRICS_PORT", 0) or 0)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((host or os.environ.get("METRICS_HOST", "127.0.0.1"), port),
+                                              MetricsHandler)
+            except OSError as e:
+                logger.warning("지표 서버를 열 수 없습니다 (포트 %d): %s", port, e)
+                _server_failed = True
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            logger.info("지표 서버 실행 중: http://%s:%d/metrics", _server.server_address[0], port)
+        return _server
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+메타데이터 기반 페이지 레지스트리
+
+pages/metadata.json과 페이지 모듈을 프로세스당 한 번만 읽고, 페이지 id → 실행 함수를 찾아 둡니다.
+Streamlit 재실행마다 파일을 열고 JSON을 파싱하던 작업이 사라져, 평상시 페이지 이동에는 파일 I/O가 없습니다.
+페이지 모듈은 그 페이지를 처음 표시할 때 import 합니다. (1페이지가 감지 페이지의 PIL 등을 기다리지 않도록)
+
+개발 중에는 PAGE_HOT_RELOAD=1로 켜면 metadata.json과 페이지 모듈 파일의 수정 시각(mtime)을 확인해
+바뀐 경우에만 다시 읽고 모듈을 reload 합니다.
+"""
+import os
+import sys
+import json
+import logging
+import importlib
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PageRegistry:
+    def __init__(self, pages_dir: str = "pages", hot_reload: bool = False):
+        self.pages_dir = pages_dir
+        self.meta_path = os.path.join(pages_dir, "metadata.json")
+        self.hot_reload = hot_reload
+        self._entries: Optional[Dict[int, dict]] = None
+        self._pages: Dict[int, Callable] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _watched_files(self):
+        files = [self.meta_path]
+        for name, module in list(sys.modules.items()):
+            if name.startswith("pages.") and getattr(module, "__file__", None):
+                files.append(module.__file__)
+        return files
+
+    def _snapshot(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self._watched_files():
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                mtimes[path] = -1
+        return mtimes
+
+    def load(self, reload_modules: bool = False) -> None:
+        """metadata.json을 읽습니다. reload_modules=True면 이미 불러온 페이지 모듈도 다시 읽습니다."""
+        if not os.path.exists(self.pages_dir):
+            raise FileNotFoundError("`pages` 디렉토리를 찾을 수 없습니다. 페이지를 동적으로 로드할 수 없습니다.")
+        if not os.path.exists(self.meta_path):
+            raise FileNotFoundError("pages/metadata.json 파일을 찾을 수 없습니다.")
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        self._entries = {page_info["id"]: page_info for page_info in metadata.get("pages", [])}
+        if reload_modules:
+            for page_info in self._entries.values():
+                module_name = f"pages.{page_info['module']}"
+                if module_name in sys.modules:
+                    importlib.reload(sys.modules[module_name])
+        self._pages = {}
+        if self.hot_reload:
+            self._mtimes = self._snapshot()
+        logger.info("페이지 레지스트리 로드: %d개 페이지", len(self._entries))
+
+    def _resolve(self, page_id: int) -> Optional[Callable]:
+        """page_id의 모듈을 처음 요청될 때 import 하고 실행 함수를 찾아 둡니다."""
+        if page_id not in self._pages:
+            page_info = self._entries.get(page_id)
+            if page_info is None:
+                return None
+            module = importlib.import_module(f"pages.{page_info['module']}")
+            self._pages[page_id] = getattr(module, page_info["function"])
+            if self.hot_reload:
+                self._mtimes = self._snapshot()
+        return self._pages[page_id]
+
+    def get(self, page_id: int) -> Optional[Callable]:
+        """page_id의 실행 함수. 처음 호출될 때(또는 hot reload 중 파일이 바뀌었을 때)만 파일을 읽습니다."""
+        with self._lock:
+            if self._entries is None:
+                self.load()
+            elif self.hot_reload and self._snapshot() != self._mtimes:
+                logger.info("페이지 파일 변경 감지: 다시 로드합니다.")
+                self.load(reload_modules=True)
+            return self._resolve(page_id)
+
+
+_registry: Optional[PageRegistry] = None
+
+
+def get_page_registry(pages_dir: str = "pages") -> PageRegistry:
+    """프로세스 공용 레지스트리 (Streamlit 재실행 사이에도 모듈 전역으로 유지됩니다)."""
+    global _registry
+    if _registry is None:
+        hot_reload = os.environ.get("PAGE_HOT_RELOAD", "0").strip().lower() in ("1", "true", "yes")
+        _registry = PageRegistry(pages_dir, hot_reload=hot_reload)
+    return _registry
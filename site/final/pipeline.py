@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+분석 파이프라인 병렬 실행기
+
+run_all_analyses()가 끝난 뒤의 단계들(피드백 이미지 렌더링, GPT 조언 생성)은 서로 독립적이므로 동시에 실행합니다.
+run_analysis()가 리포트를 내놓는 즉시(on_report) GPT 조언을 submit_stage()로 프로세스 공용 스레드 풀에 띄우고
+렌더링은 이어서 진행하므로, 전체 소요 시간은 각 단계의 합이 아니라 max(렌더링, GPT)가 됩니다.
+(UI에서는 4단계 작업이 렌더링하는 동안 5단계가 GPT 조언을 스트리밍합니다.)
+
+이미지 바이트는 blob_store에 두고 세션에는 핸들만 저장합니다. (compact_workflow_result, store_image)
+run_analysis()는 분석 리포트와 피드백 이미지 핸들을 공유 캐시(shared_cache)에 두어 다른 워커 프로세스와 함께 씁니다.
+"""
+import base64
+import logging
+from io import BytesIO
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from blob_store import get_blob_store
+from tracing import span
+from metrics import RENDER_BYTES
+from shared_cache import get_shared_cache, make_key
+
+logger = logging.getLogger(__name__)
+
+# Streamlit 세션들이 함께 쓰는 프로세스 단위 스레드 풀
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pipeline")
+
+
+def submit_stage(fn: Callable, *args, **kwargs) -> Future:
+    """단계 하나를 백그라운드에서 시작하고 Future를 반환합니다."""
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def compact_workflow_result(workflow_result: dict, acquire: bool = True) -> dict:
+    """세션에 둘 워크플로우 결과. base64 output_image는 블롭 저장소로 옮기고 핸들만 남깁니다."""
+    compact = {k: v for k, v in workflow_result.items() if k != "output_image"}
+    output_b64 = workflow_result.get("output_image")
+    if output_b64:
+        compact["output_image_handle"] = get_blob_store().put(base64.b64decode(output_b64), acquire=acquire)
+    return compact
+
+
+def load_output_image(workflow_result: dict):
+    """워크플로우 결과 이미지 바이트 (핸들 또는 예전 형식의 base64). 없으면 None."""
+    if not isinstance(workflow_result, dict):
+        return None
+    handle = workflow_result.get("output_image_handle")
+    if handle:
+        # draw_feedback_on_image가 BytesIO로 복사해 디코딩하므로 mmap 대신 바이트로 읽습니다. (매핑/fd를 남기지 않도록)
+        return get_blob_store().get(handle)
+    output_b64 = workflow_result.get("output_image")
+    return base64.b64decode(output_b64) if output_b64 else None
+
+
+def store_image(image, fmt: str = "PNG", acquire: bool = True) -> str:
+    """PIL 이미지를 인코딩해 블롭 저장소에 넣고 핸들을 반환합니다."""
+    return get_blob_store().put(_encode_image(image, fmt).getbuffer(), acquire=acquire)
+
+
+def _encode_image(image, fmt: str = "PNG") -> BytesIO:
+    buffer = BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer
+
+
+def release_handles(handles: Iterable[Optional[str]]) -> None:
+    store = get_blob_store()
+    for handle in handles:
+        store.release(handle)
+
+
+def render_feedback_image(workflow_result: dict, report: list, analyzer) -> Optional[str]:
+    """
+    워크플로우 결과 이미지 위에 피드백을 그려 블롭 저장소에 넣고 핸들을 반환합니다. 그릴 이미지가 없으면 None.
+    결과는 여러 세션이 함께 쓸 수 있으므로 참조는 잡지 않습니다. (세션이 가져갈 때 acquire)
+    """
+    image_bytes = load_output_image(workflow_result)
+    if image_bytes is None:
+        return None
+    # PIL을 쓰는 시각화 모듈은 첫 렌더링 때 불러옵니다. (1페이지 표시를 늦추지 않도록)
+    from image_visualizer import draw_feedback_on_image
+
+    with span("render.feedback"):
+        image = draw_feedback_on_image(image_bytes, report, analyzer)
+    buffer = _encode_image(image)
+    RENDER_BYTES.observe(buffer.tell())
+    return get_blob_store().put(buffer.getbuffer(), acquire=False)
+
+
+def build_overlay(workflow_result: dict, main_screen_raw: dict, main_screen_inch, user_inputs: dict) -> Optional[dict]:
+    """
+    피드백을 래스터로 그리지 않고 오버레이 명세(image_visualizer.build_feedback_overlay)만 만듭니다.
+    클라이언트가 원본 사진 위에 겹쳐 문제별로 켜고 끌 수 있습니다. 겹칠 이미지가 없으면 None.
+    """
+    image_bytes = load_output_image(workflow_result)
+    if image_bytes is None:
+        return None
+    from PIL import Image
+    from desk_analysis import analyze_workflow_result
+    from image_visualizer import build_feedback_overlay
+
+    with span("render.overlay"):
+        report, analyzer = analyze_workflow_result(workflow_result, main_screen_raw, main_screen_inch, user_inputs)
+        # 헤더만 읽어 크기를 얻습니다. (디코딩 없음)
+        image_size = Image.open(BytesIO(image_bytes)).size
+        return build_feedback_overlay(report, analyzer, image_size)
+
+
+def _analysis_cache_keys(workflow_result: dict, main_screen_raw: dict, main_screen_inch, user_inputs: dict):
+    inputs = {"workflow": workflow_result, "main_screen": main_screen_raw, "inch": main_screen_inch,
+              "user": user_inputs}
+    return make_key("report", inputs), make_key("render", inputs)
+
+
+def run_analysis(workflow_result: dict, main_screen_raw: dict, main_screen_inch, user_inputs: dict,
+                 on_stage: Optional[Callable[[str], None]] = None,
+                 on_report: Optional[Callable[[list], None]] = None, render: bool = True) -> Dict[str, Any]:
+    """
+    감지 결과 정리 → 규칙 분석 → (render=True면) 피드백 이미지 렌더링.
+    {"detailed_report", "feedback_image"(핸들), "render_error"}를 반환하고, 리포트가 나오면 on_report(리포트)를 부릅니다.
+    같은 입력의 리포트와 이미지가 공유 캐시에 있으면 분석과 렌더링을 건너뜁니다.
+    """
+    from desk_analysis import analyze_workflow_result
+
+    cache = get_shared_cache()
+    report_key, render_key = _analysis_cache_keys(workflow_result, main_screen_raw, main_screen_inch, user_inputs)
+    report = cache.get(report_key) if cache else None
+    feedback_handle = cache.get(render_key) if cache and render and report is not None else None
+    if report is not None and (not render or get_blob_store().exists(feedback_handle)):
+        if on_report:
+            on_report(report)
+        return {"detailed_report": report, "feedback_image": feedback_handle, "render_error": False}
+
+    report, analyzer = analyze_workflow_result(
+        workflow_result, main_screen_raw, main_screen_inch, user_inputs, on_stage=on_stage)
+    if cache:
+        cache.put(report_key, report)
+    if on_report:
+        on_report(report)
+
+    result = {"detailed_report": report, "feedback_image": None, "render_error": False}
+    if render:
+        if on_stage:
+            on_stage("render")
+        try:
+            result["feedback_image"] = render_feedback_image(workflow_result, report, analyzer)
+        except Exception:
+            logger.exception("피드백 이미지 렌더링 실패")
+            result["render_error"] = True
+        if cache and result["feedback_image"]:
+            cache.put(render_key, result["feedback_image"])
+    return result
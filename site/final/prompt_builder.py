@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+토큰 예산 기반 압축 프롬프트 빌더
+
+- 분석 리포트를 짧은 키의 한 줄 형식으로 직렬화합니다. (json.dumps(indent=2) 대비 공백/반복 키 제거)
+  개선이 필요한 항목(High/Moderate)만 세부 수치를 모두 싣고, 양호(Low) 항목은 이름만 한 줄로 요약합니다.
+- 토큰 수를 로컬에서 계산합니다. tiktoken이 설치되어 있으면 정확히 세고, 없으면 근사치를 사용합니다.
+- 입력 토큰 예산(PROMPT_TOKEN_BUDGET, 기본 1200)을 넘으면 덜 중요한 정보부터 줄입니다.
+- 호출마다 프롬프트/응답 토큰 사용량을 로그로 남깁니다.
+"""
+import os
+import logging
+from typing import Optional
+
+from metrics import GPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# NOTE: tiktoken은 선택적입니다. 없으면 문자 수 기반 근사치로 셉니다.
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+DEFAULT_TOKEN_BUDGET = 1200
+
+SYSTEM_PROMPT = "You are a world-class ergonomics expert providing advice in Korean."
+
+ADVICE_INSTRUCTIONS = (
+    "당신은 인체공학 전문가입니다. 위 분석 결과를 해석해 구체적이고 실용적인 책상 환경 개선 방안을 한국어로 친절하게 설명하세요.\n"
+    "번호 목록으로 다음을 반드시 포함하세요:\n"
+    "1. **종합 진단**: 긍정적인 점과 가장 시급한 개선점 요약\n"
+    "2. **상세 개선 방안**: High/Moderate 항목별 구체적인 해결책 (예: 모니터 높이 조절, 손목 받침대 추천)\n"
+    "3. **추가적인 팁**: 리포트에 없더라도 건강한 컴퓨터 작업을 위한 일반 팁(스트레칭, 휴식 등) 2-3가지"
+)
+
+# details 키 → 짧은 키
+SHORT_KEYS = {
+    "delta_cm": "d_cm",
+    "ideal_height_cm": "ideal_cm",
+    "estimated_actual_height_cm": "actual_cm",
+    "has_support": "support",
+    "has_external_keyboard": "ext_kb",
+    "has_wrist_rest": "wrist_rest",
+    "handedness": "hand",
+    "lamp_side": "lamp",
+    "actual_distance_cm": "dist_cm",
+    "threshold_cm": "max_cm",
+    "is_vertically_aligned": "aligned",
+    "horizontal_distance_cm": "win_cm",
+    "main_screen_type": "type",
+    "screen_width_ratio": "ratio",
+}
+
+
+def get_token_budget() -> int:
+    try:
+        return int(os.environ.get("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    except ValueError:
+        return DEFAULT_TOKEN_BUDGET
+
+
+def count_tokens(text: str) -> int:
+    """텍스트의 토큰 수. tiktoken이 없으면 ASCII 4자당 1토큰, 한글 등 비ASCII 1자당 1토큰으로 근사합니다."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def count_message_tokens(messages: list) -> int:
+    """chat 메시지 목록의 토큰 수 (메시지당 형식 오버헤드 4토큰 포함)."""
+    return sum(count_tokens(m.get("content", "")) + 4 for m in messages) + 2
+
+
+# --------------------------------------------------------------------------
+# 1. 리포트 압축 직렬화
+# --------------------------------------------------------------------------
+def _compact_value(value) -> str:
+    if isinstance(value, bool):
+        return "Y" if value else "N"
+    if isinstance(value, float):
+        return f"{value:.1f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def compact_item(item: dict, with_details: bool = True) -> str:
+    """예: SCREEN_HEIGHT|High|d_cm=16.3,ideal_cm=55.1,actual_cm=71.4,support=N"""
+    line = f"{item.get('problem_id')}|{item.get('severity')}"
+    details = item.get("details") or {}
+    if with_details and details:
+        line += "|" + ",".join(f"{SHORT_KEYS.get(k, k)}={_compact_value(v)}" for k, v in details.items())
+    return line
+
+
+def compact_report(report: list, level: int = 0) -> str:
+    """
+    리포트를 압축 문자열로 만듭니다. level이 높을수록 더 줄입니다.
+        0: 개선 항목 전체 세부 + 양호 항목 이름 요약
+        1: 양호 항목 요약 생략
+        2: 개선 항목의 세부 수치 생략
+        3: High 항목만
+    """
+    problems = [p for p in report if p.get("severity") != "Low"]
+    if level >= 3:
+        problems = [p for p in problems if p.get("severity") == "High"]
+    lines = ["항목|심각도|세부"]
+    lines.extend(compact_item(p, with_details=level < 2) for p in problems)
+    good = [p.get("problem_id") for p in report if p.get("severity") == "Low"]
+    if good and level < 1:
+        lines.append("양호(Low): " + ",".join(good))
+    return "\n".join(lines)
+
+
+# --------------------------------------------------------------------------
+# 2. 예산 안에서 프롬프트 생성
+# --------------------------------------------------------------------------
+def build_advice_prompt(report: list, budget: Optional[int] = None) -> list:
+    """예산 안에 들어올 때까지 리포트를 단계적으로 줄여 GPT 메시지 목록을 만듭니다."""
+    budget = budget or get_token_budget()
+    messages = []
+    for level in range(4):
+        prompt_text = f"책상 환경 인체공학 분석 결과:\n{compact_report(report, level)}\n\n{ADVICE_INSTRUCTIONS}"
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_text}
+        ]
+        tokens = count_message_tokens(messages)
+        if tokens <= budget:
+            if level:
+                logger.info("프롬프트를 예산(%d토큰)에 맞춰 압축 단계 %d로 줄였습니다.", budget, level)
+            return messages
+    logger.warning("프롬프트가 최대 압축 후에도 예산(%d토큰)을 넘습니다: %d토큰", budget, tokens)
+    return messages
+
+
+def log_token_usage(label: str, messages: list, usage=None) -> None:
+    """로컬 추정 프롬프트 토큰과 API가 보고한 사용량(usage)을 함께 로그로 남깁니다."""
+    estimated = count_message_tokens(messages)
+    if usage is None:
+        GPT_TOKENS.inc(estimated, label=label, kind="prompt_estimated")
+        logger.info("[%s] 토큰 사용량: prompt≈%d (로컬 추정), completion=알 수 없음", label, estimated)
+        return
+    GPT_TOKENS.inc(getattr(usage, "prompt_tokens", None) or 0, label=label, kind="prompt")
+    GPT_TOKENS.inc(getattr(usage, "completion_tokens", None) or 0, label=label, kind="completion")
+    logger.info("[%s] 토큰 사용량: prompt=%s (로컬 추정 %d), completion=%s, total=%s", label,
+                getattr(usage, "prompt_tokens", None), estimated,
+                getattr(usage, "completion_tokens", None), getattr(usage, "total_tokens", None))
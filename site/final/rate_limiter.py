@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+외부 서비스(GPT, Roboflow 감지) 호출용 프로세스 전역 속도 제한기와 공정 대기열
+
+- 토큰 버킷: 서비스별 분당 호출 수(rate)와 순간 허용량(burst)을 제한해 제공자 rate limit에 걸리지 않게 합니다.
+- 공정 대기열: 세션별 FIFO 대기열을 라운드 로빈으로 돌며 차례를 줍니다.
+  한 세션이 요청을 몰아 보내도 다른 세션이 뒤로 밀리지 않습니다.
+- 배압(backpressure): 전체 대기 수가 max_pending을 넘으면 QueueFullError로 즉시 거절합니다.
+- 대기 중에는 on_wait(position) 콜백으로 현재 대기 순번을 알려 UI에 표시할 수 있습니다.
+
+환경변수로 설정할 수 있습니다. (NAME은 GPT / DETECTION)
+    {NAME}_RATE_PER_MIN  (기본: GPT 60, DETECTION 120)
+    {NAME}_BURST         (기본: 5)
+    {NAME}_MAX_PENDING   (기본: 50)
+"""
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+
+class QueueFullError(RuntimeError):
+    """대기열이 가득 차 요청을 받을 수 없을 때 발생합니다."""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """토큰을 하나 꺼내면 0, 부족하면 다음 토큰까지 기다려야 할 초를 반환합니다. (락은 호출자가 잡음)"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FairRateLimiter:
+    def __init__(self, name: str, rate_per_min: float, burst: int = 5, max_pending: int = 50):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.max_pending = max_pending
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()  # session_id -> 대기 티켓
+        self._cond = threading.Condition()
+        self.stats = {"admitted": 0, "rejected": 0, "waited": 0}
+
+    def _pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _head(self):
+        """라운드 로빈 순서상 다음 차례인 티켓 (가장 오래 차례를 받지 못한 세션의 첫 티켓)."""
+        for queue in self._queues.values():
+            if queue:
+                return queue[0]
+        return None
+
+    def _position(self, session_id: str, ticket) -> int:
+        """라운드 로빈을 가정했을 때의 대기 순번 (1 = 다음 차례)."""
+        k = self._queues[session_id].index(ticket)
+        ahead = sum(min(len(queue), k) for queue in self._queues.values())  # 앞선 k개 라운드
+        for sid, queue in self._queues.items():  # 같은 라운드에서 앞선 세션
+            if sid == session_id:
+                break
+            if len(queue) > k:
+                ahead += 1
+        return ahead + 1
+
+    def acquire(self, session_id: str, on_wait: Optional[Callable[[int], None]] = None,
+                timeout: Optional[float] = 120) -> None:
+        """차례가 오고 토큰이 생길 때까지 기다립니다. 대기열이 가득 차면 QueueFullError."""
+        ticket = object()
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            if self._pending() >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise QueueFullError(f"{self.name} 대기열이 가득 찼습니다 ({self.max_pending}건).")
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            last_position = None
+            try:
+                while True:
+                    if self._head() is ticket:
+                        wait = self.bucket.try_take()
+                        if wait == 0:
+                            break
+                    else:
+                        wait = 0.5
+                    position = self._position(session_id, ticket)
+                    if on_wait and position != last_position:
+                        last_position = position
+                        on_wait(position)
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(f"{self.name} 대기 시간이 {timeout}초를 넘었습니다.")
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._remove(session_id, ticket)
+                self._cond.notify_all()
+                raise
+            self._remove(session_id, ticket)
+            # 차례를 받은 세션은 라운드 로빈 순서의 맨 뒤로 보냅니다.
+            if session_id in self._queues:
+                self._queues.move_to_end(session_id)
+            self.stats["admitted"] += 1
+            if last_position is not None:
+                self.stats["waited"] += 1
+            self._cond.notify_all()
+
+    def _remove(self, session_id: str, ticket) -> None:
+        queue = self._queues.get(session_id)
+        if queue is None:
+            return
+        if ticket in queue:
+            queue.remove(ticket)
+        if not queue:
+            del self._queues[session_id]
+
+
+_DEFAULTS = {"GPT": 60, "DETECTION": 120}
+_limiters: Dict[str, FairRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def current_session_id(default: Optional[str] = "default") -> Optional[str]:
+    """현재 Streamlit 세션 ID (공정 대기열의 세션 구분용). 스크립트 밖(API, 작업 스레드 등)에서는 default."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return default
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else default
+
+
+def get_limiter(name: str) -> FairRateLimiter:
+    """프로세스 공용 제한기를 이름(GPT / DETECTION)으로 가져옵니다."""
+    name = name.upper()
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = FairRateLimiter(
+                name,
+                rate_per_min=float(os.environ.get(f"{name}_RATE_PER_MIN", _DEFAULTS.get(name, 60))),
+                burst=int(os.environ.get(f"{name}_BURST", 5)),
+                max_pending=int(os.environ.get(f"{name}_MAX_PENDING", 50)),
+            )
+        return _limiters[name]
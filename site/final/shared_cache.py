@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+여러 프로세스가 함께 쓰는 공유 캐시 (감지 결과, 분석 리포트, 피드백 이미지, AI 조언)
+
+운영에서는 Streamlit 워커 프로세스 여러 개가 로드 밸런서 뒤에서 돕니다. st.cache_data나 모듈 전역 dict는
+프로세스마다 따로라서 같은 사진, 같은 리포트에 대해 프로세스마다 감지/GPT 비용을 따로 냅니다.
+이 캐시는 같은 호스트(또는 네트워크 KV를 쓰면 여러 호스트)의 모든 프로세스가 함께 씁니다.
+
+- 키: "<종류>:<버전>:<sha256>" 형식. 종류는 detection / report / render / advice 이고,
+  sha256은 입력(이미지 바이트, 정규화된 JSON 등)으로 만듭니다. make_key() 참고.
+- 값: JSON. 이미지 바이트는 넣지 않고 blob_store 핸들만 넣습니다.
+- 백엔드 (SHARED_CACHE_URL):
+    sqlite:///.cache/shared_cache.sqlite3  (기본) 호스트 안의 프로세스가 WAL 모드 SQLite 파일을 공유
+    redis://host:6379/0                    여러 호스트가 공유. 크기 제한은 Redis의 maxmemory 정책을 따름
+    memory://                              프로세스 안 LRU. 네트워크 KV 대신 테스트에서 쓰는 대역
+- 크기 기준 정리: 전체 값 크기가 SHARED_CACHE_MAX_BYTES를 넘으면 가장 오래 쓰지 않은 항목부터 지웁니다.
+
+환경변수로 설정할 수 있습니다.
+    SHARED_CACHE_URL        (기본: sqlite:///.cache/shared_cache.sqlite3, "off"면 사용 안 함)
+    SHARED_CACHE_MAX_BYTES  (기본: 256MB)
+    SHARED_CACHE_TTL_SEC    (기본: 7일)
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Optional, Tuple
+
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = "v1"
+DEFAULT_CACHE_URL = "sqlite:///" + os.path.join(".cache", "shared_cache.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SEC = 7 * 24 * 60 * 60
+
+
+def make_key(kind: str, *parts: Any) -> str:
+    """캐시 키. parts가 바이트 하나면 그 내용으로, 아니면 정렬된 JSON으로 sha256을 만듭니다."""
+    if len(parts) == 1 and isinstance(parts[0], (bytes, bytearray, memoryview)):
+        digest = hashlib.sha256(parts[0]).hexdigest()
+    else:
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{kind}:{CACHE_VERSION}:{digest}"
+
+
+# --------------------------------------------------------------------------
+# 1. 백엔드 (get / set / delete)
+# --------------------------------------------------------------------------
+class SQLiteKV:
+    """호스트 안의 여러 프로세스가 공유하는 SQLite 파일. 전체 크기는 meta 테이블에 누적합니다."""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv ("
+                         " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                         " expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_kv_last_access ON kv(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (name, value) "
+                         "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM kv")
+
+    @contextmanager
+    def _connect(self):
+        """트랜잭션 단위 연결. 정상 종료 시 커밋하고 항상 닫습니다."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._delete(conn, key)
+                return None
+            conn.execute("UPDATE kv SET last_access = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+
+    def set(self, key: str, value: bytes, ttl_sec: float) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            old = conn.execute("SELECT size FROM kv WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                         (key, sqlite3.Binary(value), len(value), now + ttl_sec, now))
+            total = self._add_total(conn, len(value) - (old[0] if old else 0))
+            if total > self.max_bytes:
+                self._evict(conn, total, now)
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            self._delete(conn, key)
+
+    def _delete(self, conn, key: str) -> None:
+        row = conn.execute("SELECT size FROM kv WHERE key = ?", (key,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            self._add_total(conn, -row[0])
+
+    @staticmethod
+    def _add_total(conn, delta: int) -> int:
+        conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+        return conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _evict(self, conn, total: int, now: float) -> None:
+        """만료 항목을 먼저 지우고, 그래도 넘치면 최대 크기의 90%가 될 때까지 오래 안 쓴 항목부터 지웁니다."""
+        freed = conn.execute("SELECT COALESCE(SUM(size), 0) FROM kv WHERE expires_at < ?", (now,)).fetchone()[0]
+        conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+        total -= freed
+        target = self.max_bytes * 0.9
+        victims = []
+        if total > target:
+            for key, size in conn.execute("SELECT key, size FROM kv ORDER BY last_access ASC"):
+                victims.append(key)
+                freed += size
+                total -= size
+                if total <= target:
+                    break
+            conn.executemany("DELETE FROM kv WHERE key = ?", [(key,) for key in victims])
+        self._add_total(conn, -freed)
+        logger.info("공유 캐시 정리: %d바이트 (%d개 항목)", freed, len(victims))
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+            total = conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+
+class MemoryKV:
+    """프로세스 안 LRU. 네트워크 KV 백엔드 자리에 넣어 테스트하는 대역입니다."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] < time.time():
+                self._total -= len(self._items.pop(key)[0])
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key: str, value: bytes, ttl_sec: float) -> None:
+        with self._lock:
+            if key in self._items:
+                self._total -= len(self._items.pop(key)[0])
+            self._items[key] = (bytes(value), time.time() + ttl_sec)
+            self._total += len(value)
+            while self._total > self.max_bytes and self._items:
+                _, (old, _) = self._items.popitem(last=False)
+                self._total -= len(old)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._items:
+                self._total -= len(self._items.pop(key)[0])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+class RedisKV:
+    """여러 호스트가 공유하는 Redis. 크기 제한은 서버의 maxmemory / allkeys-lru 설정으로 맡깁니다."""
+
+    def __init__(self, url: str):
+        # NOTE: redis 라이브러리는 선택적 의존성이라 이 백엔드를 고를 때만 import 합니다.
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl_sec: float) -> None:
+        self._client.set(key, value, ex=max(1, int(ttl_sec)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def stats(self) -> dict:
+        return {"entries": self._client.dbsize()}
+
+
+def make_backend(url: str, max_bytes: int = DEFAULT_MAX_BYTES):
+    if url.startswith("sqlite:///"):
+        return SQLiteKV(url[len("sqlite:///"):], max_bytes)
+    if url.startswith(("redis://", "rediss://")):
+        return RedisKV(url)
+    if url.startswith("memory://"):
+        return MemoryKV(max_bytes)
+    raise ValueError(f"지원하지 않는 공유 캐시 주소입니다: {url}")
+
+
+# --------------------------------------------------------------------------
+# 2. JSON 캐시
+# --------------------------------------------------------------------------
+class SharedCache:
+    def __init__(self, backend, ttl_sec: float = DEFAULT_TTL_SEC):
+        self.backend = backend
+        self.ttl_sec = ttl_sec
+
+    def get(self, key: str) -> Optional[Any]:
+        """키의 JSON 값. 없거나 백엔드 오류면 None. (캐시 장애가 요청을 실패시키지 않도록)"""
+        try:
+            raw = self.backend.get(key)
+        except Exception:
+            logger.exception("공유 캐시 조회 실패")
+            raw = None
+        record_cache_lookup(f"shared.{key.split(':', 1)[0]}", raw is not None)
+        return None if raw is None else json.loads(raw)
+
+    def put(self, key: str, value: Any, ttl_sec: Optional[float] = None) -> None:
+        try:
+            raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+            self.backend.set(key, raw, ttl_sec or self.ttl_sec)
+        except Exception:
+            logger.exception("공유 캐시 저장 실패")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(key)
+        except Exception:
+            logger.exception("공유 캐시 삭제 실패")
+
+
+_cache: Optional[SharedCache] = None
+_cache_ready = False
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """프로세스 공용 공유 캐시. 꺼져 있거나(SHARED_CACHE_URL=off) 만들 수 없으면 None."""
+    global _cache, _cache_ready
+    with _cache_lock:
+        if not _cache_ready:
+            _cache_ready = True
+            url = os.environ.get("SHARED_CACHE_URL", DEFAULT_CACHE_URL)
+            if url != "off":
+                try:
+                    backend = make_backend(url, int(os.environ.get("SHARED_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+                    _cache = SharedCache(backend, float(os.environ.get("SHARED_CACHE_TTL_SEC", DEFAULT_TTL_SEC)))
+                except Exception:
+                    logger.exception("공유 캐시 생성 실패")
+        return _cache
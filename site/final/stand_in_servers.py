@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Roboflow 워크플로우 / OpenAI chat.completions 로컬 대역(stand-in) 서버
+
+부하·지연 테스트를 외부 API 없이 돌리기 위한 가짜 서버입니다. 두 API의 요청/응답 형식을 그대로 따르므로
+앱 코드는 설정(환경변수)만 바꿔서 이 서버를 바라보게 할 수 있습니다.
+
+    python stand_in_servers.py --port 9100 --latency-ms 800 --jitter 0.4 --error-rate 0.02 --seed 7
+
+    export ROBOFLOW_API_URL=http://127.0.0.1:9100     # InferenceHTTPClient(api_url=...)
+    export ROBOFLOW_API_KEY=dummy
+    export OPENAI_BASE_URL=http://127.0.0.1:9100/v1   # OpenAI / AsyncOpenAI 기본 base_url
+    export OPENAI_API_KEY=dummy
+
+- POST /{workspace}/workflows/{workflow_id} : run_workflow 응답({"outputs": [...]}).
+  예측 결과는 site/yujin/visual_colab_ver 의 샘플 출력을 기반으로 시드에 따라 약간씩 흔듭니다.
+- POST /v1/chat/completions : 일반 응답과 SSE 스트리밍(stream=True, include_usage)을 모두 지원합니다.
+- 지연은 로그정규분포(중앙값 --latency-ms, 분산 --jitter), 오류는 --error-rate 확률로 발생합니다.
+  스트리밍 속도는 --tokens-per-sec 로 조절합니다.
+"""
+import json
+import math
+import time
+import uuid
+import random
+import struct
+import base64
+import argparse
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# site/yujin/visual_colab_ver 의 Roboflow 샘플 출력
+SAMPLE_PREDICTIONS = [
+    {"x": 376.5, "y": 557.5, "width": 485, "height": 297, "confidence": 0.948, "class": "screen", "class_id": 5},
+    {"x": 337.5, "y": 907, "width": 351, "height": 102, "confidence": 0.941, "class": "keyboard", "class_id": 1},
+    {"x": 174, "y": 428, "width": 154, "height": 172, "confidence": 0.938, "class": "desk lamp", "class_id": 0},
+    {"x": 569, "y": 910.5, "width": 84, "height": 71, "confidence": 0.932, "class": "mouse", "class_id": 4},
+]
+SAMPLE_IMAGE_SIZE = (1000, 1200)
+
+CANNED_ADVICE = (
+    "1. **종합 진단**: 조명 위치는 잘 배치되어 있습니다. 가장 시급한 점은 모니터 높이와 손목 받침대입니다.\n\n"
+    "2. **상세 개선 방안**:\n"
+    "- **모니터 높이**: 모니터 받침대나 모니터 암으로 화면 상단이 눈높이에 오도록 조절하세요.\n"
+    "- **손목 받침대**: 키보드와 마우스 앞에 젤 타입 손목 받침대를 두세요.\n\n"
+    "3. **추가적인 팁**:\n"
+    "- 20분마다 먼 곳을 20초간 바라보세요.\n"
+    "- 1시간에 한 번은 일어나 목과 어깨를 스트레칭하세요."
+)
+
+
+class StandInConfig:
+    def __init__(self, latency_ms=800.0, jitter=0.3, error_rate=0.0, tokens_per_sec=50.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tokens_per_sec = tokens_per_sec
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """로그정규분포 지연(초). 중앙값이 latency_ms가 됩니다."""
+        with self._rng_lock:
+            return self.latency_ms / 1000.0 * math.exp(self.rng.gauss(0, self.jitter))
+
+    def should_fail(self) -> bool:
+        with self._rng_lock:
+            return self.rng.random() < self.error_rate
+
+    def jittered_predictions(self) -> list:
+        with self._rng_lock:
+            preds = []
+            for p in SAMPLE_PREDICTIONS:
+                q = dict(p)
+                q["x"] = round(p["x"] + self.rng.uniform(-8, 8), 1)
+                q["y"] = round(p["y"] + self.rng.uniform(-8, 8), 1)
+                q["confidence"] = round(min(0.99, p["confidence"] + self.rng.uniform(-0.03, 0.03)), 3)
+                q["detection_id"] = str(uuid.UUID(int=self.rng.getrandbits(128)))
+                preds.append(q)
+            return preds
+
+
+def image_size_from_bytes(data: bytes):
+    """PNG/JPEG 헤더에서 (width, height)를 읽습니다. 알 수 없으면 샘플 크기."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            length = struct.unpack(">H", data[i + 2:i + 4])[0]
+            if marker in (0xC0, 0xC1, 0xC2):
+                h, w = struct.unpack(">HH", data[i + 5:i + 9])
+                return w, h
+            i += 2 + length
+    return SAMPLE_IMAGE_SIZE
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    config: StandInConfig = StandInConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        time.sleep(self.config.sample_latency())
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completions(payload)
+        elif "/workflows/" in self.path:
+            self._run_workflow(payload)
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    # ----------------------------------------------------------------------
+    # Roboflow run_workflow
+    # ----------------------------------------------------------------------
+    def _run_workflow(self, payload: dict) -> None:
+        if self.config.should_fail():
+            self._send_json(500, {"message": "stand-in: injected workflow error"})
+            return
+        image_input = (payload.get("inputs") or {}).get("image") or {}
+        image_b64 = image_input.get("value") if isinstance(image_input, dict) else None
+        width, height = SAMPLE_IMAGE_SIZE
+        if image_b64:
+            try:
+                width, height = image_size_from_bytes(base64.b64decode(image_b64))
+            except Exception:
+                pass
+        predictions = self.config.jittered_predictions()
+        output = {
+            "count_objects": len(predictions),
+            "image": {"width": width, "height": height},
+            "predictions": {"image": {"width": width, "height": height}, "predictions": predictions},
+            # 실제 워크플로우는 박스가 그려진 이미지를 돌려주지만, 대역 서버는 입력 이미지를 그대로 돌려줍니다.
+            "output_image": image_b64,
+        }
+        self._send_json(200, {"outputs": [output]})
+
+    # ----------------------------------------------------------------------
+    # OpenAI chat.completions
+    # ----------------------------------------------------------------------
+    def _chat_completions(self, payload: dict) -> None:
+        if self.config.should_fail():
+            self._send_json(429, {"error": {"message": "stand-in: injected rate limit", "type": "rate_limit_error",
+                                            "code": "rate_limit_exceeded"}})
+            return
+        model = payload.get("model", "gpt-3.5-turbo")
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        max_tokens = int(payload.get("max_tokens") or 1024)
+        pieces = CANNED_ADVICE.split(" ")[:max_tokens]
+        usage = {"prompt_tokens": prompt_chars // 2, "completion_tokens": len(pieces),
+                 "total_tokens": prompt_chars // 2 + len(pieces)}
+        completion_id = f"chatcmpl-standin-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not payload.get("stream"):
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(pieces)}}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(choices, extra=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": choices}
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        delay = 1.0 / self.config.tokens_per_sec if self.config.tokens_per_sec > 0 else 0
+        try:
+            send_chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for i, piece in enumerate(pieces):
+                text = piece if i == 0 else " " + piece
+                send_chunk([{"index": 0, "delta": {"content": text}, "finish_reason": None}])
+                time.sleep(delay)
+            send_chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                send_chunk([], {"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("클라이언트가 스트림 도중 연결을 끊었습니다.")
+
+
+def make_server(host="127.0.0.1", port=9100, config: StandInConfig = None) -> ThreadingHTTPServer:
+    """설정을 적용한 대역 서버를 만듭니다. (테스트에서는 serve_forever를 스레드로 띄워 사용)"""
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {"config": config or StandInConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roboflow / OpenAI 로컬 대역 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="응답 지연 중앙값(ms)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="로그정규 지연 분포의 sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="오류 응답 확률 (0~1)")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="스트리밍 토큰 속도")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = StandInConfig(args.latency_ms, args.jitter, args.error_rate, args.tokens_per_sec, args.seed)
+    server = make_server(args.host, args.port, config)
+    logger.info("대역 서버 실행 중: http://%s:%d (OPENAI_BASE_URL=http://%s:%d/v1, ROBOFLOW_API_URL=http://%s:%d)",
+                args.host, args.port, args.host, args.port, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+콜드 스타트 프로파일러 (모듈별 import 시간과 첫 화면 표시까지의 시간)
+
+배포나 오토스케일로 새 프로세스가 뜨면 첫 세션은 무거운 라이브러리(openai, inference_sdk, PIL, numpy 등)를
+import 하는 동안 1페이지를 보지 못합니다. 이 모듈은 import 훅으로 모듈마다 걸린 시간을 재서
+어떤 의존성이 첫 화면을 늦추는지 보여줍니다.
+
+- 자기 시간(self): 그 모듈의 코드만 실행한 시간, 누적 시간(cumulative): 그 모듈이 import 한 모듈까지 포함한 시간
+- final_app은 STARTUP_PROFILE=1 일 때 맨 처음 install()을 호출하고, 1페이지를 처음 그린 뒤
+  report를 로그로 남기며 "startup.first_render" span을 기록합니다.
+
+명령줄에서 특정 모듈들의 import 비용만 볼 수도 있습니다.
+    python startup_profile.py desk_analysis advice_engine pipeline detection
+"""
+import sys
+import time
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP = 20
+
+_started_at: Optional[float] = None
+_timings: Dict[str, Dict[str, float]] = {}
+_local = threading.local()
+_reported = False
+_lock = threading.Lock()
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class _TimedLoader:
+    """원래 로더를 감싸 exec_module 시간을 잽니다. 나머지 속성은 원래 로더에 그대로 넘깁니다."""
+
+    def __init__(self, loader, name: str):
+        self._loader = loader
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = _stack()
+        stack.append(0.0)  # 하위 모듈 import에 쓴 시간
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with _lock:
+                _timings[self._name] = {"self_ms": elapsed - children, "cumulative_ms": elapsed}
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder:
+    """sys.meta_path 맨 앞에서 다른 finder가 찾은 spec의 로더만 바꿔 끼웁니다."""
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname)
+                return spec
+        return None
+
+
+_finder = _TimingFinder()
+
+
+def install() -> None:
+    """import 시간 측정을 시작합니다. 여러 번 호출해도 한 번만 설치됩니다."""
+    global _started_at
+    if _finder not in sys.meta_path:
+        _started_at = time.perf_counter()
+        sys.meta_path.insert(0, _finder)
+
+
+def uninstall() -> None:
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+
+
+def is_installed() -> bool:
+    return _finder in sys.meta_path
+
+
+def elapsed_since_install_ms() -> Optional[float]:
+    return None if _started_at is None else (time.perf_counter() - _started_at) * 1000
+
+
+def report(top: int = DEFAULT_TOP, by_package: bool = True) -> List[dict]:
+    """
+    import 비용이 큰 순서의 목록. by_package=True면 최상위 패키지(openai, PIL 등)별로 묶어
+    자기 시간을 더합니다. (누적 시간은 패키지 안 모듈 중 가장 큰 값)
+    """
+    with _lock:
+        timings = dict(_timings)
+    if by_package:
+        grouped: Dict[str, Dict[str, float]] = {}
+        for name, t in timings.items():
+            root = name.split(".", 1)[0]
+            entry = grouped.setdefault(root, {"self_ms": 0.0, "cumulative_ms": 0.0, "modules": 0})
+            entry["self_ms"] += t["self_ms"]
+            entry["modules"] += 1
+            entry["cumulative_ms"] = max(entry["cumulative_ms"], t["cumulative_ms"])
+        timings = grouped
+    rows = [{"module": name, "self_ms": round(t["self_ms"], 1), "cumulative_ms": round(t["cumulative_ms"], 1),
+             **({"modules": t["modules"]} if "modules" in t else {})}
+            for name, t in timings.items()]
+    rows.sort(key=lambda r: r["self_ms"], reverse=True)
+    return rows[:top]
+
+
+def format_report(rows: List[dict]) -> str:
+    lines = [f"{'module':<40} {'self ms':>10} {'cum ms':>10}"]
+    lines += [f"{r['module']:<40} {r['self_ms']:>10.1f} {r['cumulative_ms']:>10.1f}" for r in rows]
+    return "\n".join(lines)
+
+
+def log_report_once(top: int = DEFAULT_TOP) -> bool:
+    """프로세스에서 처음 한 번만 import 시간 표를 로그로 남깁니다. 남겼으면 True."""
+    global _reported
+    with _lock:
+        if _reported:
+            return False
+        _reported = True
+    logger.info("import 시간 상위 %d개 (패키지별)\n%s", top, format_report(report(top)))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="모듈별 import 시간 측정")
+    parser.add_argument("modules", nargs="+", help="import 할 모듈 이름")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--by-module", action="store_true", help="패키지로 묶지 않고 모듈별로 표시")
+    args = parser.parse_args()
+
+    install()
+    for name in args.modules:
+        start = time.perf_counter()
+        __import__(name)
+        print(f"import {name}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print()
+    print(format_report(report(args.top, by_package=not args.by_module)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+분석 파이프라인 단계별 지연 측정 (span)
+
+- with span("detection.request"): ... 처럼 감싸면 소요 시간을 구조화된 JSON 한 줄로 로그에 남깁니다.
+    {"event": "span", "stage": "detection.request", "ms": 812.4, "ok": true, ...}
+- 단계별 최근 측정값(기본 1000개)을 프로세스 메모리에 모아 p50/p95/p99를 계산합니다. (관리자 페이지에서 조회)
+- 화면 효과용 time.sleep 같은 인위적 대기는 artificial_wait()로 바꿔 "artificial": true 로 따로 표시합니다.
+
+단계 이름 규칙: <영역>.<단계>  예) upload.decode, detection.request, analyzer.rule.analyze_wrist_rest,
+render.feedback, advice.prompt_build, advice.gpt, page.transition
+"""
+import json
+import math
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from metrics import STAGE_DURATION
+
+logger = logging.getLogger("latency")
+
+MAX_SAMPLES_PER_STAGE = 1000
+
+_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES_PER_STAGE))
+_artificial = set()
+_lock = threading.Lock()
+
+
+def record_span(stage: str, ms: float, ok: bool = True, artificial: bool = False, **attrs) -> None:
+    """측정값 하나를 집계에 더하고 JSON 로그로 남깁니다."""
+    with _lock:
+        _samples[stage].append(ms)
+        if artificial:
+            _artificial.add(stage)
+    STAGE_DURATION.observe(ms / 1000, stage=stage, ok="true" if ok else "false")
+    entry = {"event": "span", "stage": stage, "ms": round(ms, 1), "ok": ok}
+    if artificial:
+        entry["artificial"] = True
+    entry.update(attrs)
+    logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """블록의 실행 시간을 측정합니다. 예외가 나도 기록하고(ok=false) 예외는 그대로 올립니다."""
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield attrs
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record_span(stage, (time.perf_counter() - started) * 1000, ok=ok, **attrs)
+
+
+def artificial_wait(seconds: float, stage: str) -> None:
+    """인위적인 대기(time.sleep). 지연 집계에서 실제 작업과 구분되도록 표시합니다."""
+    time.sleep(seconds)
+    record_span(stage, seconds * 1000, artificial=True)
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))  # nearest-rank
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+def stage_summary(prefix: Optional[str] = None) -> Dict[str, dict]:
+    """단계별 {count, p50, p95, p99, max, artificial} (ms). prefix로 특정 영역만 고를 수 있습니다."""
+    with _lock:
+        snapshot = {stage: sorted(values) for stage, values in _samples.items()
+                    if values and (prefix is None or stage.startswith(prefix))}
+        artificial = set(_artificial)
+    return {
+        stage: {
+            "count": len(values),
+            "p50": round(_percentile(values, 50), 1),
+            "p95": round(_percentile(values, 95), 1),
+            "p99": round(_percentile(values, 99), 1),
+            "max": round(values[-1], 1),
+            "artificial": stage in artificial,
+        }
+        for stage, values in sorted(snapshot.items())
+    }
+
+
+def stage_samples(prefix: Optional[str] = None) -> Dict[str, dict]:
+    """단계별 원본 측정값 {"values": [ms...], "artificial"}. 다른 프로세스에서 잰 값을 merge_samples로 합칠 때 씁니다."""
+    with _lock:
+        return {stage: {"values": list(values), "artificial": stage in _artificial}
+                for stage, values in _samples.items() if values and (prefix is None or stage.startswith(prefix))}
+
+
+def merge_samples(samples: Dict[str, dict]) -> None:
+    """stage_samples()가 반환한 측정값을 이 프로세스의 집계에 더합니다. (로그/지표는 남기지 않음)"""
+    with _lock:
+        for stage, sample in samples.items():
+            _samples[stage].extend(sample["values"])
+            if sample.get("artificial"):
+                _artificial.add(stage)
+
+
+def reset() -> None:
+    with _lock:
+        _samples.clear()
+        _artificial.clear()